@@ -4,7 +4,7 @@
 ## PIGS C compiler
 ##
 
-import sys, argparse, re, collections
+import sys, argparse, re, functools, operator
 from pathlib import PurePath, Path
 
 from pycparser import c_ast
@@ -14,6 +14,56 @@ from pycparser.plyparser import ParseError
 SCR0     = 'v0'                             ## General purpose (scratch) register
 ARG_REGS = ('v1', 'v2', 'v3')               ## Function argument register (ARG0 ... ARG2)
 
+STMT_TAG, STMT_CMD, STMT_BRANCH = 0, 1, 2   ## AsmStatement kinds
+INSTR_OTHER, INSTR_RET, INSTR_JMP, INSTR_STA, INSTR_LDA, INSTR_LDAF, INSTR_LD = -1, 0, 1, 2, 3, 4, 5
+INSTR_IDS = {                               ## Instruction ids of instructions inspected by AsmBuffer's peephole passes
+    'RET': INSTR_RET, 'JMP': INSTR_JMP, 'STA': INSTR_STA, 'LDA': INSTR_LDA, 'LDAF': INSTR_LDAF, 'LD': INSTR_LD }
+BRANCH_INSTRS = frozenset(('CALL', 'JMP', 'JNZ', 'JZ', 'JP', 'JM'))    ## Instructions branching to a TAG label
+TAG_INSTRS = BRANCH_INSTRS | {'TAG'}        ## Instructions expecting a single TAG label argument
+FLAG_ACC_INSTRS = frozenset((               ## Instructions that leave F := A
+    'ADD', 'SUB', 'MLT', 'DIV', 'MOD', 'AND', 'OR', 'XOR', 'RLA', 'RRA', 'LDAF'))
+VAR_WRITE_INSTRS = frozenset(('STA', 'LD', 'POP')) ## Instructions writing (not reading) their 1st argument
+VAR_READ_INSTRS = frozenset((               ## Instructions only reading their arguments, see AsmBuffer.add_interferences()
+    'LDA', 'LDAF', 'ADD', 'SUB', 'MLT', 'DIV', 'MOD', 'AND', 'OR', 'XOR', 'RLA', 'RRA', 'CMP', 'PUSH',
+    'ANDL', 'ORL', 'EQ', 'NE', 'GT', 'GE', 'LT', 'LE'))
+SMALL_INT_STRS = {i: str(i) for i in range(-1, 256)}  ## Shared str objects for small int instruction arguments
+
+def int32(value):
+    ## wrap int value into the VM's signed 32-bit integer range
+    value &= 0xffffffff
+    return value - 0x100000000 if value & 0x80000000 else value
+
+def int_str(value):
+    ## returns str of int value, shared for small values
+    result = SMALL_INT_STRS.get(value)
+    return result if result is not None else str(value)
+
+def c_int_value(literal):
+    ## returns int value of C integer literal str (decimal, hex, octal, optional suffix) or None
+    literal = literal.rstrip('uUlL')
+    try:
+        if len(literal) > 1 and literal[0] == '0' and literal[1] not in 'xXbB':
+            return int(literal, 8)
+        return int(literal, 0)
+    except ValueError:
+        return None
+
+@functools.lru_cache(maxsize=None)
+def classify_type_names(type_names, accept_void, accept_uint):
+    ## returns str ctype or None if unsupported, cached on tuple(str) type_names and flags
+    if len(type_names) == 1:
+        type_name = type_names[0]
+        if type_name in ('int', 'long'):
+            return type_name
+        elif accept_void and type_name == 'void':
+            return type_name
+        elif accept_uint and type_name == 'unsigned':
+            return type_name
+    elif len(type_names) == 2:
+        if accept_uint and type_names[0] == 'unsigned' and type_names[1] in ('int', 'long'):
+            return ' '.join(type_names)
+    return None
+
 class PccError(Exception):
     def __init__(self, node, message):
         super().__init__(message)
@@ -22,24 +72,28 @@ class PccError(Exception):
 ## ---------------------------------------------------------------------------
 
 class AsmVar:
+    __slots__ = ('vm_var_id', 'var_sym', 'asm_str', 'is_local')
+
     def __init__(self, var_sym=None):
-        self.vm_var_id = None               ## None (unbound) or str "v0" ... "v149"
+        self.vm_var_id = None               ## None (unbound) or int 0 ... 149, str() expands to "v0" ... "v149"
         self.var_sym = var_sym              ## VmVariableSymbol var_sym, 1:1 relationship
-        self.unbound_id = None              ## str, fallback-id for unbound variables
+        self.asm_str = None                 ## None or str, cached str() result, fallback-id while unbound
+        self.is_local = False               ## bool, True: var_sym has a context function, set by VmVariableSymbol
 
     def bind(self, vm_var_nr):
-        self.vm_var_id = f'v{vm_var_nr}'
+        self.vm_var_id = vm_var_nr
+        self.asm_str = f'v{vm_var_nr}'
 
     _unbound_counter = 0
     def __str__(self):
-        if self.vm_var_id is not None:
-            return self.vm_var_id
-        elif self.unbound_id is None:
+        if self.asm_str is None:
             AsmVar._unbound_counter += 1
-            self.unbound_id = f'<UNBOUND_VARIABLE_{AsmVar._unbound_counter}>'
-        return self.unbound_id
+            self.asm_str = f'<UNBOUND_VARIABLE_{AsmVar._unbound_counter}>'
+        return self.asm_str
 
 class AsmStatement:
+    __slots__ = ('comment',)
+
     def __init__(self, comment=None):
         self.comment = comment              ## None or str, optional comment
 
@@ -47,58 +101,84 @@ class AsmStatement:
         raise NotImplementedError()
 
 class AsmTag(AsmStatement):
+    __slots__ = ('vm_tag_id', 'asm_str', 'canonical')
+    kind = STMT_TAG
+
     def __init__(self):
-        super().__init__()
-        self.vm_tag_id = None               ## None (unbound) or str "1", "2", ..., any unique positive integer
-        self.unbound_id = None              ## str, fallback-id for unbound TAG labels
+        self.comment = None                 ## None or str, see AsmStatement (set directly, tags are allocated often)
+        self.vm_tag_id = None               ## None (unbound) or int, any unique positive integer
+        self.asm_str = None                 ## None or str, cached str() result, fallback-id while unbound
+        self.canonical = None               ## None or AsmTag, tag this tag was merged into (union-find parent)
 
     def format_statement(self):
         return f'TAG {self}'
 
     def bind(self, vm_tag_id):
-        self.vm_tag_id = str(vm_tag_id)
+        self.vm_tag_id = vm_tag_id
+        self.asm_str = str(vm_tag_id)
+
+    def find(self):
+        ## return canonical AsmTag this tag resolves to, compress path on the way
+        root = self
+        while root.canonical is not None:
+            root = root.canonical
+        asm_tag = self
+        while asm_tag is not root:
+            asm_tag.canonical, asm_tag = root, asm_tag.canonical
+        return root
 
     _unbound_counter = 0
     def __str__(self):
-        if self.vm_tag_id is not None:
-            return self.vm_tag_id
-        elif self.unbound_id is None:
+        if self.asm_str is None:
             AsmTag._unbound_counter += 1
-            self.unbound_id = f'<UNBOUND_LABEL_{AsmTag._unbound_counter}>'
-        return self.unbound_id
+            self.asm_str = f'<UNBOUND_LABEL_{AsmTag._unbound_counter}>'
+        return self.asm_str
 
 class AsmCmd(AsmStatement):
+    __slots__ = ('instr', 'instr_id', 'args')
+    kind = STMT_CMD
+
     def __init__(self, instr, args, comment):
-        super().__init__(comment=comment)
+        self.comment = comment              ## None or str, see AsmStatement (set directly, commands are allocated often)
         self.instr = instr                  ## str, uppercase assembly language instruction
-        self.args = args                    ## list(arg), command's arguments of type int, str, AsmVar or AsmTag
+        self.instr_id = INSTR_IDS.get(instr, INSTR_OTHER) ## int, instruction id, see INSTR_IDS
+        self.args = args                    ## tuple(arg), command's arguments of type int, str, AsmVar or AsmTag
+                                            ## (list(AsmTag) for AsmBranchCmd, its tag is resolved in place)
 
+    _instr_prefixes = {}                    ## dict(str instr: str prefix), indented and padded instruction columns
     def format_statement(self):
-        return f'    {self.instr: <5} {" ".join([str(arg) for arg in self.args])}'
-
-    @staticmethod
-    def tag_instr_idx(instr):
-        try:
-            return ('TAG', 'CALL', 'JMP', 'JNZ', 'JZ', 'JP', 'JM').index(instr)
-        except ValueError:
-            return -1
+        prefix = self._instr_prefixes.get(self.instr)
+        if prefix is None:
+            prefix = self._instr_prefixes[self.instr] = f'    {self.instr: <5} '
+        args = self.args
+        if len(args) == 1:
+            return f'{prefix}{args[0]}'
+        return prefix + ' '.join(map(str, args))
 
 class AsmBranchCmd(AsmCmd):
-    pass
+    __slots__ = ()
+    kind = STMT_BRANCH
 
 class AsmBuffer:
+    __slots__ = ('stmt_buf',)
+
     def __init__(self):
         self.stmt_buf = []                  ## list(AsmStatement asm_stmt)
 
+    def emit(self, instr, *args):
+        ## fast path for any uppercase instruction that doesn't expect a single TAG label argument, without comment
+        self.stmt_buf.append(AsmCmd(instr,
+            tuple(SMALL_INT_STRS.get(arg, arg) if type(arg) is int else arg for arg in args), None))
+
     def __call__(self, instr, *args, comment=None):
-        instr = instr.upper()
-        tag_instr_idx = AsmCmd.tag_instr_idx(instr)
-        if tag_instr_idx < 0:               ## any instruction that doesn't expect a single TAG label argument
-            asm_stmt = AsmCmd(instr, list(args), comment)
-        elif len(args) != 1 or not isinstance(args[0], AsmTag):
+        ## instr must be an uppercase instruction name
+        if instr not in TAG_INSTRS:         ## any instruction that doesn't expect a single TAG label argument
+            asm_stmt = AsmCmd(instr, tuple(SMALL_INT_STRS.get(arg, arg) if type(arg) is int else arg for arg in args),
+                comment)
+        elif len(args) != 1 or type(args[0]) is not AsmTag:
             raise Exception(f'internal error: {instr} instruction expects a single AsmTag argument, ' \
                 f'found: "{" ".join([str(arg) for arg in args])}"')
-        elif tag_instr_idx == 0:            ## TAG <label> instruction (use AsmTag <label> as statement object)
+        elif instr == 'TAG':                ## TAG <label> instruction (use AsmTag <label> as statement object)
             asm_stmt = args[0]
             if comment is not None:
                 asm_stmt.comment = comment
@@ -106,85 +186,235 @@ class AsmBuffer:
             asm_stmt = AsmBranchCmd(instr, list(args), comment)
         self.stmt_buf.append(asm_stmt)
 
+    def flag_is_acc(self):
+        ## True if the trailing instructions left F := A (a TAG may be jumped to and ends the search)
+        stmt_buf = self.stmt_buf
+        i_stmt = len(stmt_buf) - 1
+        while i_stmt >= 0 and stmt_buf[i_stmt].kind == STMT_CMD and stmt_buf[i_stmt].instr_id == INSTR_STA:
+            i_stmt -= 1                     ## "STA X" changes neither A nor F
+        if i_stmt < 0 or stmt_buf[i_stmt].kind != STMT_CMD:
+            return False
+        last_stmt = stmt_buf[i_stmt]
+        if last_stmt.instr in FLAG_ACC_INSTRS:
+            return True
+        if last_stmt.instr_id == INSTR_LDA and i_stmt > 0:
+            ## "INR X + LDA X" or "DCR X + LDA X" (prefix ++X, --X): F := X, A := X
+            prev_stmt = stmt_buf[i_stmt - 1]
+            return prev_stmt.kind == STMT_CMD and prev_stmt.instr in ('INR', 'DCR') and \
+                prev_stmt.args == last_stmt.args
+        return False
+
     def replace_instruction(self, find_instr, replace_instr):
         for asm_cmd in self.stmt_buf:
-            if isinstance(asm_cmd, AsmCmd) and asm_cmd.instr == find_instr:
+            if asm_cmd.kind != STMT_TAG and asm_cmd.instr == find_instr:
                 asm_cmd.instr = replace_instr
-
-    def reduce(self):
-        in_buf = self.stmt_buf
-        out_buf = [in_buf[0]]
-        for curr_stmt in in_buf[1:]:
-            prev_stmt = out_buf[-1]
-            if isinstance(prev_stmt, AsmCmd) and isinstance(curr_stmt, AsmCmd):
-                if prev_stmt.instr == 'RET' and curr_stmt.instr == 'RET':
+                asm_cmd.instr_id = INSTR_IDS.get(replace_instr, INSTR_OTHER)
+
+    def reduce(self, fixed_tags):
+        ## peephole optimizations, tags in set fixed_tags (CALL targets) are referenced from other AsmBuffers and
+        ## are never merged or dropped
+        in_stmts = iter(self.stmt_buf)
+        prev_stmt = next(in_stmts)          ## AsmStatement, cursor on out_buf[-1]
+        prev_prev_stmt = None               ## None or AsmStatement, cursor on out_buf[-2]
+        out_buf = [prev_stmt]
+        for curr_stmt in in_stmts:
+            prev_kind = prev_stmt.kind
+            curr_kind = curr_stmt.kind
+            if prev_kind != STMT_TAG and curr_kind != STMT_TAG:
+                prev_id = prev_stmt.instr_id
+                curr_id = curr_stmt.instr_id
+                if prev_id == INSTR_RET and curr_id == INSTR_RET:
                     ## "RET + <RET>" => drop "RET", keep "<RET>"
                     continue
-                elif prev_stmt.instr == 'JMP' and curr_stmt.instr == 'JMP':
+                elif prev_id == INSTR_JMP and curr_id == INSTR_JMP:
                     ## "JMP X + <JMP Y>" => drop "JMP Y", keep "<JMP X>"
                     continue
-                elif prev_stmt.instr == 'STA' and curr_stmt.instr == 'LDA' and prev_stmt.args[0] == curr_stmt.args[0]:
-                    ## "STA X + <LDA X>" => drop "<LDA Y>", keep "STA X"
+                elif prev_id == INSTR_STA and curr_id == INSTR_LDA and prev_stmt.args[0] == curr_stmt.args[0]:
+                    ## "STA X + <LDA X>" => drop "<LDA X>", keep "STA X"
+                    continue
+                elif prev_id == INSTR_STA and curr_id == INSTR_LDAF and prev_stmt.args[0] == curr_stmt.args[0] and \
+                        prev_prev_stmt is not None and prev_prev_stmt.kind != STMT_TAG and \
+                        prev_prev_stmt.instr in FLAG_ACC_INSTRS:
+                    ## "<OP> Y + STA X + <LDAF X>" (OP leaves F := A) => drop "<LDAF X>", keep "STA X"
                     continue
-            elif isinstance(prev_stmt, AsmTag) and isinstance(curr_stmt, AsmTag):
+            elif prev_kind == STMT_TAG and curr_kind == STMT_TAG and curr_stmt not in fixed_tags:
                 ## "TAG X + <TAG Y>" => replace all uses of "Y" with "X", keep "TAG X", drop "TAG Y"
                 self._replace_tag(curr_stmt, prev_stmt)
                 continue
-            elif isinstance(prev_stmt, AsmTag) and isinstance(curr_stmt, AsmCmd) and curr_stmt.instr == 'JMP':
-                if len(out_buf) > 2 and isinstance(out_buf[-2], AsmCmd) and out_buf[-2].instr == 'JMP':
+            elif prev_kind == STMT_TAG and curr_kind != STMT_TAG and curr_stmt.instr_id == INSTR_JMP and \
+                    curr_stmt.args[0].find() is not prev_stmt and prev_stmt not in fixed_tags:
+                ## (skipped for "TAG X + <JMP X>", an endless loop that must keep its "TAG X", and for fixed tags)
+                self._replace_tag(prev_stmt, curr_stmt.args[0])
+                if prev_prev_stmt is not None and prev_prev_stmt.kind != STMT_TAG and \
+                        prev_prev_stmt.instr_id == INSTR_JMP:
                     ## "JMP Z + TAG X + <JMP Y>" => replace all uses of "X" with "Y", drop both "TAG X" and "<JMP Y>"
-                    self._replace_tag(prev_stmt, curr_stmt.args[0])
                     del out_buf[-1]
-                    continue
+                    prev_stmt = prev_prev_stmt
+                    prev_prev_stmt = out_buf[-2] if len(out_buf) > 1 else None
                 else:
                     ## "TAG X + <JMP Y>" => replace all uses of "X" with "Y", drop "TAG X", keep "<JMP Y>"
-                    self._replace_tag(prev_stmt, curr_stmt.args[0])
-                    out_buf[-1] = curr_stmt
-                    continue
-            elif isinstance(prev_stmt, AsmCmd) and isinstance(curr_stmt, AsmTag):
-                if prev_stmt.instr == 'JMP' and prev_stmt.args[0] == curr_stmt:
+                    out_buf[-1] = prev_stmt = curr_stmt
+                continue
+            elif curr_kind == STMT_TAG and prev_kind != STMT_TAG:
+                if prev_stmt.instr_id == INSTR_JMP and prev_stmt.args[0].find() is curr_stmt:
                     ## "JMP X + <TAG X>" => drop "JMP X", keep "<TAG X>"
-                    out_buf[-1] = curr_stmt
+                    out_buf[-1] = prev_stmt = curr_stmt
                     continue
             out_buf.append(curr_stmt)
+            prev_prev_stmt = prev_stmt
+            prev_stmt = curr_stmt
+        ## resolve merged tags in branch-commands in a single final pass
+        for asm_stmt in out_buf:
+            if asm_stmt.kind == STMT_BRANCH:
+                asm_stmt.args[0] = asm_stmt.args[0].find()
         self.stmt_buf = out_buf
 
-    def drop_unused_tags(self, tag_use_count):
-        for asm_stmt in self.stmt_buf:
-            if isinstance(asm_stmt, AsmTag) and asm_stmt not in tag_use_count:
-                tag_use_count[asm_stmt] = 0
-            elif isinstance(asm_stmt, AsmBranchCmd):
-                asm_tag = asm_stmt.args[0]
-                if asm_tag not in tag_use_count:
-                    tag_use_count[asm_tag] = 1
-                else:
-                    tag_use_count[asm_tag] += 1
-        ## drop TAG-commands of tags that are not used in any branch-command
+    def drop_unused_tags(self, used_tags):
+        ## drop TAG-commands of tags that are neither in set used_tags nor used in any branch-command
+        used_tags = used_tags.union(asm_stmt.args[0] for asm_stmt in self.stmt_buf if asm_stmt.kind == STMT_BRANCH)
         self.stmt_buf = [asm_stmt for asm_stmt in self.stmt_buf
-            if not isinstance(asm_stmt, AsmTag) or tag_use_count[asm_stmt] != 0]
-
-    def bind_tags(self, tag_id_offset):
+            if asm_stmt.kind != STMT_TAG or asm_stmt in used_tags]
+
+    def finalize(self, tag_id_offset, asm_vars, global_asm_vars, local_asm_vars, used_tags=None):
+        ## drop unused tags (unless used_tags is None), bind tags and collect VM variables in a single pass,
+        ## returns the number of bound tags and the next buffer's tag id offset (rounded up to a multiple of 10)
+        if used_tags is not None:
+            used_tags = used_tags.union(asm_stmt.args[0] for asm_stmt in self.stmt_buf
+                if asm_stmt.kind == STMT_BRANCH)
+        out_buf = []
         tag_counter = 0
-        for asm_tag in self.stmt_buf:
-            if isinstance(asm_tag, AsmTag):
-                asm_tag.bind(tag_id_offset + tag_counter)
+        for asm_stmt in self.stmt_buf:
+            if asm_stmt.kind == STMT_TAG:
+                if used_tags is not None and asm_stmt not in used_tags:
+                    continue
+                asm_stmt.bind(tag_id_offset + tag_counter)
                 tag_counter += 1
-        return tag_counter
-
-    def collect_vm_variables(self, global_asm_vars, local_asm_vars):
-        for asm_cmd in self.stmt_buf:
-            if isinstance(asm_cmd, AsmCmd):
-                for asm_var in asm_cmd.args:
-                    if isinstance(asm_var, AsmVar):
-                        if asm_var.var_sym.context_function is None:
-                            global_asm_vars[asm_var] = True
+            else:
+                for asm_var in asm_stmt.args:
+                    if type(asm_var) is AsmVar and asm_var not in asm_vars:
+                        asm_vars.add(asm_var)
+                        if asm_var.is_local:
+                            local_asm_vars.append(asm_var)
                         else:
-                            local_asm_vars[asm_var] = True
+                            global_asm_vars.append(asm_var)
+            out_buf.append(asm_stmt)
+        self.stmt_buf = out_buf
+        return tag_counter, ((tag_id_offset + tag_counter + 10) // 10) * 10
+
+    def add_interferences(self, interference, moves, call_uses, call_defs):
+        ## liveness analysis of AsmVars, adds an edge to interference (dict(AsmVar: set(AsmVar))) for each pair of
+        ## variables where one is (possibly) written while the other one is live. call_uses and call_defs map
+        ## CALL targets (AsmTag) to the AsmVars read and possibly written by the called function.
+        ## Instructions not in VAR_WRITE_INSTRS or VAR_READ_INSTRS are assumed to read and write their AsmVars.
+        ## Copies "LD X Y" and "LDA Y + STA X" are appended to moves as tuple(AsmVar X, AsmVar Y), they don't
+        ## make X interfere with Y.
+        no_vars = frozenset()
+        stmt_buf = self.stmt_buf
+        n_stmts = len(stmt_buf)
+        tag_idx = {asm_stmt: i for i, asm_stmt in enumerate(stmt_buf) if asm_stmt.kind == STMT_TAG}
+        succs = []                      ## list(tuple(int stmt_idx)), successor statements
+        uses = []                       ## list(frozenset(AsmVar)), variables read
+        kills = []                      ## list(frozenset(AsmVar)), variables written, not read
+        defs = []                       ## list(frozenset(AsmVar)), variables (possibly) written
+        move_srcs = []                  ## list(None or AsmVar), source variable of copy statements
+        prev_stmt = None
+        for i_stmt, asm_stmt in enumerate(stmt_buf):
+            next_idx = (i_stmt + 1,) if i_stmt + 1 < n_stmts else ()
+            use = kill = may_def = no_vars
+            move_src = None
+            if asm_stmt.kind == STMT_TAG:
+                succ = next_idx
+            elif asm_stmt.kind == STMT_BRANCH:
+                target = asm_stmt.args[0].find()
+                target_idx = (tag_idx[target],) if target in tag_idx else ()
+                if asm_stmt.instr == 'CALL':
+                    succ = next_idx
+                    use = call_uses.get(target, no_vars)
+                    may_def = call_defs.get(target, no_vars)
+                elif asm_stmt.instr == 'JMP':
+                    succ = target_idx
+                else:
+                    succ = target_idx + next_idx
+            else:
+                instr = asm_stmt.instr
+                succ = () if instr in ('RET', 'HALT') else next_idx
+                args = asm_stmt.args
+                if any(type(arg) is AsmVar for arg in args):
+                    if instr in VAR_WRITE_INSTRS:
+                        kill = frozenset(args[:1]) if type(args[0]) is AsmVar else no_vars
+                        use = frozenset(arg for arg in args[1:] if type(arg) is AsmVar)
+                        if kill:
+                            if instr == 'LD' and len(args) == 2 and type(args[1]) is AsmVar:
+                                move_src = args[1]
+                            elif instr == 'STA' and prev_stmt is not None and prev_stmt.kind == STMT_CMD and \
+                                    prev_stmt.instr in ('LDA', 'LDAF') and len(prev_stmt.args) == 1 and \
+                                    type(prev_stmt.args[0]) is AsmVar:
+                                move_src = prev_stmt.args[0]
+                            if move_src is not None:
+                                moves.append((args[0], move_src))
+                    elif instr in VAR_READ_INSTRS:
+                        use = frozenset(arg for arg in args if type(arg) is AsmVar)
+                    else:
+                        use = may_def = frozenset(arg for arg in args if type(arg) is AsmVar)
+            succs.append(succ)
+            uses.append(use)
+            kills.append(kill)
+            defs.append(kill | may_def)
+            move_srcs.append(move_src)
+            prev_stmt = asm_stmt
+        ## iterate live-in sets backwards to a fixed point
+        live_in = [no_vars] * n_stmts
+        changed = True
+        while changed:
+            changed = False
+            for i_stmt in range(n_stmts - 1, -1, -1):
+                live_out = no_vars.union(*[live_in[i_succ] for i_succ in succs[i_stmt]])
+                stmt_live_in = uses[i_stmt] | (live_out - kills[i_stmt])
+                if stmt_live_in != live_in[i_stmt]:
+                    live_in[i_stmt] = stmt_live_in
+                    changed = True
+        ## written variables interfere with variables live after the write
+        for i_stmt in range(n_stmts):
+            if defs[i_stmt]:
+                live_out = no_vars.union(*[live_in[i_succ] for i_succ in succs[i_stmt]])
+                move_src = move_srcs[i_stmt]
+                for def_var in defs[i_stmt]:
+                    for live_var in live_out:
+                        if live_var is not def_var and live_var is not move_src:
+                            interference.setdefault(def_var, set()).add(live_var)
+                            interference.setdefault(live_var, set()).add(def_var)
+
+    def drop_redundant_moves(self):
+        ## drop copies made redundant by variables sharing the same VM variable: "LD X X", "LDA X + <STA X>"
+        ## and "STA X + <LDA X>"
+        out_buf = []
+        prev_var_id = None              ## None or int, VM variable id of previous "LDA X", "LDAF X" or "STA X"
+        prev_id = INSTR_OTHER           ## int, instruction id of previous "LDA X", "LDAF X" or "STA X"
+        for asm_stmt in self.stmt_buf:
+            var_id = None
+            curr_id = INSTR_OTHER
+            if asm_stmt.kind == STMT_CMD:
+                args = asm_stmt.args
+                instr_id = asm_stmt.instr_id
+                if instr_id == INSTR_LD and len(args) == 2 and type(args[0]) is AsmVar and \
+                        type(args[1]) is AsmVar and args[0].vm_var_id == args[1].vm_var_id:
+                    continue
+                if instr_id in (INSTR_STA, INSTR_LDA, INSTR_LDAF) and len(args) == 1 and type(args[0]) is AsmVar:
+                    var_id = args[0].vm_var_id
+                    curr_id = instr_id
+                    if var_id == prev_var_id and ((curr_id == INSTR_STA and prev_id != INSTR_STA) or
+                            (curr_id == INSTR_LDA and prev_id == INSTR_STA)):
+                        continue
+            out_buf.append(asm_stmt)
+            prev_var_id, prev_id = var_id, curr_id
+        self.stmt_buf = out_buf
 
     def _replace_tag(self, find_tag, replace_tag):
-        for asm_cmd in self.stmt_buf:
-            if isinstance(asm_cmd, AsmBranchCmd) and asm_cmd.args[0] is find_tag:
-                asm_cmd.args[0] = replace_tag
+        ## link find_tag to replace_tag, branch-commands are resolved lazily using AsmTag.find(); reduce() must
+        ## keep the TAG of a branch that targets itself, the identity test only keeps the links acyclic
+        replace_tag = replace_tag.find()
+        if replace_tag is not find_tag:
+            find_tag.canonical = replace_tag
 
 ## ---------------------------------------------------------------------------
 
@@ -193,57 +423,62 @@ class EmulatedInstrs:
         'NEG':   'int NEG(): A=-A; F=A',
         'NOT':   'int NOT(): A=~A; F=A',
         'NOTL':  'int NOTL(): A=!A; A:(0|1)',
-        'ANDL': f'int ANDL({SCR0}): A=(A && {SCR0}); A:(0|1)',
-        'ORL':  f'int ORL({SCR0}): A=(A || {SCR0}); A:(0|1)',
         'EQ':   f'int EQ({SCR0}): A=(A == {SCR0}); A:(0|1)',
         'NE':   f'int NE({SCR0}): A=(A != {SCR0}); A:(0|1)',
         'GT':   f'int GT({SCR0}): A=(A > {SCR0}); A:(0|1)',
         'GE':   f'int GE({SCR0}): A=(A >= {SCR0}); A:(0|1)',
         'LT':   f'int LT({SCR0}): A=(A < {SCR0}); A:(0|1)',
-        'LE':   f'int LE({SCR0}): A=(A <= {SCR0}); A:(0|1)' }
-
-    INLINED_INSTR = ('NEG', 'NOT')
+        'LE':   f'int LE({SCR0}): A=(A <= {SCR0}); A:(0|1)',
+        'RET0':  'RET0: A=0; return FALSE (shared tail, jumped to from other emulator functions)' }
 
     class InstrFunc:
+        __slots__ = ('instr', 'asm_tag', 'asm_buf')
+
         def __init__(self, instr, asm_tag, asm_buf):
             self.instr = instr          ## str, emulated instruction name
             self.asm_tag = asm_tag      ## AsmTag, emulator function entry point's TAG
             self.asm_buf = asm_buf      ## AsmBuffer, emulator function body's statement buffer
-            self.caller = set()         ## set(str func_name), set of calling function names
 
     def __init__(self):
         self.instr_funcs = {}           ## dict(str instr: InstrFunc instr_func), emulated instructions
 
-    def is_emulated(self, instr):
-        return instr in self.EMULATED_INSTR
-
-    def drop_caller(self, func_names_dropped):
-        drop_instrs = []
-        for instr, instr_func in self.instr_funcs.items():
-            instr_func.caller -= func_names_dropped
-            if len(instr_func.caller) == 0:
-                drop_instrs.append(instr)
-        for instr in drop_instrs:
-            del self.instr_funcs[instr]
+    def drop_unused(self, asm_bufs):
+        ## keep only emulator functions that are called from any of the given AsmBuffers, and the shared
+        ## tails these jump to
+        used_tags = {asm_stmt.args[0] for asm_buf in asm_bufs
+            for asm_stmt in asm_buf.stmt_buf if asm_stmt.kind == STMT_BRANCH}
+        used_tags.update(asm_stmt.args[0] for instr_func in self.instr_funcs.values()
+            if instr_func.asm_tag in used_tags
+            for asm_stmt in instr_func.asm_buf.stmt_buf if asm_stmt.kind == STMT_BRANCH)
+        self.instr_funcs = {instr: instr_func for instr, instr_func in self.instr_funcs.items()
+            if instr_func.asm_tag in used_tags}
 
     def asm_bufs(self):
         return [instr_func.asm_buf for instr_func in self.instr_funcs.values()]
 
     def compile(self, cc, instr):       ## A := instr(A); F := undef
-        if instr not in self.instr_funcs:
-            if instr in self.INLINED_INSTR:
-                getattr(self, f'_compile_{instr}_inline')(cc.asm_out)
+        instr_func = self.instr_funcs.get(instr)
+        if instr_func is not None:      ## already defined: call its entry point directly
+            asm_tag = instr_func.asm_tag
+        else:
+            compile_inline = self.INLINE_COMPILERS.get(instr)
+            if compile_inline is not None:
+                compile_inline(self, cc.asm_out)
                 return
+            asm_tag = self.instr_func_tag(instr)
+        cc.asm_out('CALL', asm_tag, comment=instr)
+
+    def instr_func_tag(self, instr):
+        ## returns the entry point's AsmTag of emulator function instr, compiles its definition on first use
+        instr_func = self.instr_funcs.get(instr)
+        if instr_func is None:
             asm_tag = AsmTag()
             asm_out = AsmBuffer()
             asm_out('TAG', asm_tag, comment=self.EMULATED_INSTR[instr])
-            getattr(self, f'_compile_{instr}_definition')(asm_out)
+            self.DEFINITION_COMPILERS[instr](self, asm_out)
             asm_out('RET')
-            self.instr_funcs[instr] = self.InstrFunc(instr, asm_tag, asm_out)
-        instr_func = self.instr_funcs[instr]
-        func_name = cc.context_function.func_name if cc.context_function is not None else '.init'
-        instr_func.caller.add(func_name)
-        cc.asm_out('CALL', instr_func.asm_tag, comment=instr)
+            instr_func = self.instr_funcs[instr] = self.InstrFunc(instr, asm_tag, asm_out)
+        return instr_func.asm_tag
 
     def _compile_NEG_inline(self, asm_out):
         asm_out('XOR', '0xffffffff')    ## A := A ^ 0xffffffff
@@ -252,92 +487,75 @@ class EmulatedInstrs:
     def _compile_NOT_inline(self, asm_out):
         asm_out('XOR', '0xffffffff')    ## A := A ^ 0xffffffff; F := A
 
-    def _compile_NOTL_definition(self, asm_out):
-        true_tag = AsmTag()
-        asm_out('OR', 0, comment='F=A') ## assert F := A before conditional jump
-        asm_out('JZ', true_tag)         ## IF (F == 0) GOTO true_tag
+    def _compile_RET0_definition(self, asm_out):
         asm_out('LDA', 0)
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
 
-    def _compile_ANDL_definition(self, asm_out):
-        ret_tag = AsmTag()
-        asm_out('OR', 0, comment='F=A') ## assert F := A before conditional jump
-        asm_out('JZ', ret_tag)          ## IF (F == 0) GOTO ret_tag
-        asm_out('LDA', SCR0)
+    def _compile_NOTL_definition(self, asm_out):
+        false_tag = self.instr_func_tag('RET0')
         asm_out('OR', 0, comment='F=A') ## assert F := A before conditional jump
-        asm_out('JZ', ret_tag)          ## IF (F == 0) GOTO ret_tag
-        asm_out('LDA', 1)
-        asm_out('TAG', ret_tag)         ## ret_tag: return TRUE or FALSE
-
-    def _compile_ORL_definition(self, asm_out):
-        true_tag = AsmTag()
-        asm_out('OR', SCR0)             ## A := A | SCR0, F := A
-        asm_out('JNZ', true_tag)        ## IF (F != 0) GOTO true_tag
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JNZ', false_tag)       ## IF (F != 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_EQ_definition(self, asm_out):
-        true_tag = AsmTag()
+        false_tag = self.instr_func_tag('RET0')
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JZ', true_tag)         ## IF (F == 0) GOTO true_tag
-        asm_out('LDA', 0)
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JNZ', false_tag)       ## IF (F != 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_NE_definition(self, asm_out):
-        true_tag = AsmTag()
+        false_tag = self.instr_func_tag('RET0')
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JNZ', true_tag)        ## IF (F != 0) GOTO true_tag
-        asm_out('LDA', 0)               ## A := 0
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JZ', false_tag)        ## IF (F == 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_GT_definition(self, asm_out):
-        false_tag = AsmTag()
+        false_tag = self.instr_func_tag('RET0')
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JZ', false_tag)        ## IF (F == 0) GOTO false_tag
-        asm_out('JM', false_tag)        ## IF (F < 0) GOTO false_tag
-        asm_out('LDA', 1)
-        asm_out('RET')                  ## return TRUE
-        asm_out('TAG', false_tag)       ## false_tag: return FALSE
-        asm_out('LDA', 0)
+        asm_out('JZ', false_tag)        ## IF (F == 0) return FALSE
+        asm_out('JM', false_tag)        ## IF (F < 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_GE_definition(self, asm_out):
-        true_tag = AsmTag()
+        false_tag = self.instr_func_tag('RET0')
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JP',  true_tag)        ## IF (F >= 0) GOTO true_tag
-        asm_out('LDA', 0)
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JM', false_tag)        ## IF (F < 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_LT_definition(self, asm_out):
-        true_tag = AsmTag()
+        false_tag = self.instr_func_tag('RET0')
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JM',  true_tag)        ## IF (F < 0) GOTO true_tag
-        asm_out('LDA', 0)
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JP', false_tag)        ## IF (F >= 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
 
     def _compile_LE_definition(self, asm_out):
-        true_tag = AsmTag()
+        ## (A <= SCR0) is (SCR0 >= A), swap A and SCR0 to test a single flag condition
+        false_tag = self.instr_func_tag('RET0')
+        asm_out('PUSHA')                ## push A
+        asm_out('LDA', SCR0)            ## A := SCR0
+        asm_out('POP', SCR0)            ## SCR0 := A (pushed)
         asm_out('CMP', SCR0)            ## F := A - SCR0
-        asm_out('JZ', true_tag)         ## IF (F == 0) GOTO true_tag
-        asm_out('JM', true_tag)         ## IF (F < 0) GOTO true_tag
-        asm_out('LDA', 0)
-        asm_out('RET')                  ## return FALSE
-        asm_out('TAG', true_tag)        ## true_tag: return TRUE
-        asm_out('LDA', 1)
+        asm_out('JM', false_tag)        ## IF (F < 0) return FALSE
+        asm_out('LDA', 1)               ## return TRUE
+
+    INLINE_COMPILERS = {                ## dict(str instr: function), emulated instructions compiled inline
+        'NEG':  _compile_NEG_inline,
+        'NOT':  _compile_NOT_inline }
+
+    DEFINITION_COMPILERS = {            ## dict(str instr: function), emulated instructions compiled as functions
+        'RET0': _compile_RET0_definition,
+        'NOTL': _compile_NOTL_definition,
+        'EQ':   _compile_EQ_definition,
+        'NE':   _compile_NE_definition,
+        'GT':   _compile_GT_definition,
+        'GE':   _compile_GE_definition,
+        'LT':   _compile_LT_definition,
+        'LE':   _compile_LE_definition }
 
 ## ---------------------------------------------------------------------------
 
 class FunctionPrototype:
+    __slots__ = ('is_vm_function', 'arg_ctypes', 'ret_ctype')
+
     def __init__(self, decl_node, is_vm_function):
         arg_ctypes = []
         func_args = decl_node.type.args
@@ -355,23 +573,17 @@ class FunctionPrototype:
             self.ret_ctype == other.ret_ctype
 
     def _parse_ctype(self, node, accept_void=False, accept_uint=False):
-        if isinstance(node.type, c_ast.IdentifierType):
-            type_names = node.type.names
-            if len(type_names) == 1:
-                type_name = type_names[0]
-                if type_name in ('int', 'long'):
-                    return type_name
-                elif accept_void and type_name == 'void':
-                    return type_name
-                elif accept_uint and type_name == 'unsigned':
-                    return type_name
-            elif len(type_names) == 2:
-                if accept_uint and type_names[0] == 'unsigned' and type_names[1] in ('int', 'long'):
-                    return ' '.join(type_names)
-            raise PccError(node.type, f'unsupported type "{" ".join(type_names)}"')
+        if type(node.type) is c_ast.IdentifierType:
+            type_names = tuple(node.type.names)
+            ctype = classify_type_names(type_names, accept_void, accept_uint)
+            if ctype is None:
+                raise PccError(node.type, f'unsupported type "{" ".join(type_names)}"')
+            return ctype
         raise PccError(node.type, 'unsupported type')
 
 class Function:
+    __slots__ = ('decl_node', 'func_name', 'prototype', 'arg_count', 'has_return')
+
     def __init__(self, decl_node, prototype):
         self.decl_node = decl_node
         self.func_name = decl_node.name
@@ -386,6 +598,8 @@ class Function:
         raise NotImplementedError()
 
 class UserDefFunction(Function):
+    __slots__ = ('impl_node', 'caller', 'asm_tag', 'asm_buf', 'arg_vars', 'static_asm_tags')
+
     def __init__(self, decl_node, prototype):
         super().__init__(decl_node, prototype)
         if self.func_name == 'main':
@@ -466,22 +680,25 @@ class VmApiFunction(Function):
         'gpioSetMode':                  'MI',       ## EIS: normal prototype MI x1 x2
         'gpioSetPullUpDown':            'PUDI' }    ## EIS: normal prototype PUDI x1 x2
 
+    __slots__ = ('use_cis', 'instr', 'map_argument')
+
     def __init__(self, decl_node, prototype, use_cis):
         super().__init__(decl_node, prototype)
         self.use_cis = use_cis
         self.instr = None
+        self.map_argument = None
         if use_cis:
             self.map_argument = getattr(self, f'_map_argument_cis_{self.func_name}', None)
 
     def asm_repr(self):
         if self.instr is None:
             func_name = self.func_name
-            if not self.use_cis and func_name in self.VM_FUNCTION_INSTR_EIS:
-                self.instr = self.VM_FUNCTION_INSTR_EIS[func_name]
-            else:
-                if func_name not in self.VM_FUNCTION_INSTR_CIS:
+            instr = None if self.use_cis else self.VM_FUNCTION_INSTR_EIS.get(func_name)
+            if instr is None:
+                instr = self.VM_FUNCTION_INSTR_CIS.get(func_name)
+                if instr is None:
                     raise PccError(self.decl_node, f'undefined VM function "{func_name}"')
-                self.instr = self.VM_FUNCTION_INSTR_CIS[func_name]
+            self.instr = instr
         return self.instr
 
     def _map_argument_cis_gpioSetMode(self, node, i_arg, const_arg):
@@ -513,6 +730,8 @@ class VmApiFunction(Function):
 ## ---------------------------------------------------------------------------
 
 class AbstractSymbol:
+    __slots__ = ('cname',)
+
     def __init__(self, cname):
         self.cname = cname              ## str cname, symbol's C name in scope
 
@@ -520,6 +739,8 @@ class AbstractSymbol:
         raise NotImplementedError()     ## that properly expand themselves with str()
 
 class EnumSymbol(AbstractSymbol):
+    __slots__ = ('const_value',)
+
     def __init__(self, cname, const_value):
         super().__init__(cname)
         self.const_value = const_value
@@ -528,11 +749,15 @@ class EnumSymbol(AbstractSymbol):
         return self.const_value
 
 class VariableSymbol(AbstractSymbol):
+    __slots__ = ('ctype',)
+
     def __init__(self, ctype, cname):
         super().__init__(cname)
         self.ctype = ctype
 
 class VmVariableSymbol(VariableSymbol):
+    __slots__ = ('asm_var', 'decl_node', 'context_function')
+
     def __init__(self, ctype, cname, asm_var, decl_node, context_function):
         super().__init__(ctype, cname)
         if asm_var is None:
@@ -544,11 +769,14 @@ class VmVariableSymbol(VariableSymbol):
             self.asm_var = asm_var
         self.decl_node = decl_node
         self.context_function = context_function
+        self.asm_var.is_local = context_function is not None
 
     def asm_repr(self):                 ## AsmVar asm_var, str() expands to VM variable name ("vN")
         return self.asm_var
 
 class VmParameterSymbol(VariableSymbol):
+    __slots__ = ('asm_par',)
+
     def __init__(self, ctype, cname, asm_par):
         super().__init__(ctype, cname)
         self.asm_par = asm_par
@@ -557,6 +785,8 @@ class VmParameterSymbol(VariableSymbol):
         return self.asm_par
 
 class FunctionSymbol(AbstractSymbol):
+    __slots__ = ('function',)
+
     def __init__(self, cname, function):
         super().__init__(cname)
         self.function = function
@@ -566,8 +796,19 @@ class FunctionSymbol(AbstractSymbol):
 
 ## ---------------------------------------------------------------------------
 
+class PointerIndentTable(dict):
+    ## str.translate() table that keeps TAB and SPACE and maps any other character to SPACE
+    def __init__(self):
+        super().__init__({ord('\t'): '\t', ord(' '): ' '})
+
+    def __missing__(self, codepoint):
+        self[codepoint] = ' '
+        return ' '
+
+## ---------------------------------------------------------------------------
+
 class PccLogger:
-    NON_WHITESPACE_PATTERN = re.compile(r'[^\t ]')
+    POINTER_INDENT_TABLE = PointerIndentTable()
 
     def __init__(self, c_sources, debug, file=sys.stderr):
         self.c_sources = c_sources      ## CSourceBundle, C sources to compile
@@ -609,7 +850,7 @@ class PccLogger:
                     self.e_location = e_location
                     error_msg = f'{filename}: In function "{ctx_func_name}":\n'
             src_line = self.c_sources.line_at(filename, row)
-            pointer_indent = self.NON_WHITESPACE_PATTERN.sub(src_line[:col-1])
+            pointer_indent = src_line[:col-1].translate(self.POINTER_INDENT_TABLE)
             error_msg += f'{filename}:{row}:{col}: {message}\n{src_line}\n{pointer_indent}^^^'
         print(error_msg, file=self.file)
 
@@ -642,7 +883,64 @@ class AstCompiler:
         '<':  'LT',                         ## A=(A <  x); F=undef/A (CIS/EIS); A:(0|1)
         '<=': 'LE' }                        ## A=(A <= x); F=undef/A (CIS/EIS); A:(0|1)
 
-    PARAM_PATTERN = re.compile(r'(?:.*_)?(p[0-9])(?:_.*)?')
+    ASSIGN_OP_INSTR = {                     ## assignment operators: tuple(str op_instr, bool is_commutative)
+        '+=':  ('ADD', True),
+        '-=':  ('SUB', False),
+        '*=':  ('MLT', True),
+        '/=':  ('DIV', False),
+        '%=':  ('MOD', False),
+        '&=':  ('AND', True),
+        '|=':  ('OR',  True),
+        '^=':  ('XOR', True),
+        '<<=': ('RLA', False),
+        '>>=': ('RRA', False) }
+
+    COMPARE_FALSE_JUMPS = {                 ## jump instructions taken after "CMP x" if (A <op> x) is false
+        '==': ('JNZ',),                     ## F != 0
+        '!=': ('JZ',),                      ## F == 0
+        '<':  ('JP',),                      ## F >= 0
+        '>=': ('JM',),                      ## F < 0
+        '>':  ('JZ', 'JM') }                ## F <= 0
+
+    NEGATED_COMPARE_OP = {
+        '==': '!=', '!=': '==', '<': '>=', '>=': '<', '>': '<=', '<=': '>' }
+
+    LOGICAL_OPS = frozenset(('&&', '||'))
+
+    ADDITIVE_OPS = frozenset(('+', '-'))
+
+    EXPRESSION_NODES = frozenset((          ## AST classes compiled by compile_statement() that yield a value
+        c_ast.UnaryOp, c_ast.BinaryOp, c_ast.Assignment, c_ast.FuncCall))
+
+    SWAPPED_BINARY_OP = {                   ## (a <op> b) is (b <swapped-op> a)
+        '+': '+', '*': '*', '&': '&', '|': '|', '^': '^',
+        '==': '==', '!=': '!=', '<': '>', '>': '<', '<=': '>=', '>=': '<=' }
+
+    UNARY_OP_FOLD = {                       ## constant folding of unary ops: op(int a) -> int
+        '+':  operator.pos,
+        '-':  operator.neg,
+        '~':  operator.invert,
+        '!':  operator.not_ }
+
+    BINARY_OP_FOLD = {                      ## constant folding of binary ops: op(int a, int b) -> int or None
+        '+':  operator.add,
+        '-':  operator.sub,
+        '*':  operator.mul,
+        '/':  lambda a, b: (abs(a) // abs(b)) * (-1 if (a < 0) != (b < 0) else 1) if b != 0 else None,
+        '%':  lambda a, b: a - (abs(a) // abs(b)) * (-1 if (a < 0) != (b < 0) else 1) * b if b != 0 else None,
+        '&':  operator.and_,
+        '|':  operator.or_,
+        '^':  operator.xor,
+        '<<': lambda a, b: a << b if 0 <= b < 32 else None,
+        '>>': lambda a, b: a >> b if 0 <= b < 32 else None,
+        '&&': lambda a, b: a != 0 and b != 0,
+        '||': lambda a, b: a != 0 or b != 0,
+        '==': operator.eq,
+        '!=': operator.ne,
+        '>':  operator.gt,
+        '>=': operator.ge,
+        '<':  operator.lt,
+        '<=': operator.le }
 
     def __init__(self, log, c_sources, use_cis=True):
         self.log = log                      ## PccLogger, log sink
@@ -651,12 +949,41 @@ class AstCompiler:
         self.functions = {}                 ## dict(str func_name: Function function), user-defined and VM API functions
         self.init_asm_buf = AsmBuffer()     ## AsmBuffer, topmost output buffer
         self.asm_out = self.init_asm_buf    ## AsmBuffer, current output buffer
-        self.scope = collections.ChainMap() ## ChainMap, current scope with chained parents
+        self.symbols = {}                   ## dict(str cname: AbstractSymbol symbol), visible symbols
+        self.scopes = [{}]                  ## list(dict(str cname: None or AbstractSymbol shadowed_symbol)), stack of
+                                            ## scopes (innermost last) with the symbols their bindings shadowed
         self.context_function = None        ## None or UserDefFunction, current function context
-        self.loop_tag_stack = []            ## list(), stack of loop AsmTag contexts
         self.loop_continue_tag = None       ## None or AsmTag, current tag to JMP to in case of a "continue" statement
         self.loop_break_tag = None          ## None or AsmTag, current tag to JMP to in case of a "break" statement
+        self.loop_jump_tags = set()         ## set(AsmTag), tags jumped to by any compiled "continue" or "break" statement
         self.in_expression = False          ## bool, True: currently evaluating an expression
+        self.folded_constants = {}          ## dict(int id(node): None or int), cached results of folded UnaryOp/BinaryOp nodes
+        self.parsed_terms = {}              ## dict(int id(node): None or term), cached try_parse_term() results in current scope
+        ## CIS has no ANDL/ORL, && and || are marked emulated and always compiled with short-circuit evaluation
+        self.binary_op_instrs = {           ## dict(str op: tuple(str op_instr, bool is_emulated)), see BINARY_OP_INSTR
+            op: (op_instr, use_cis and (op_instr in EmulatedInstrs.EMULATED_INSTR or op in self.LOGICAL_OPS))
+            for op, op_instr in self.BINARY_OP_INSTR.items() }
+        self.compile_node_funcs = {         ## dict(type ast_class: method compile_func), see compile_statement()
+            c_ast.UnaryOp:          self._compile_UnaryOp_node,
+            c_ast.BinaryOp:         self._compile_BinaryOp_node,
+            c_ast.Assignment:       self._compile_Assignment_node,
+            c_ast.Compound:         self._compile_Compound_node,
+            c_ast.Return:           self._compile_Return_node,
+            c_ast.Decl:             self._compile_Decl_node,
+            c_ast.FuncDef:          self._compile_FuncDef_node,
+            c_ast.FuncCall:         self._compile_FuncCall_node,
+            c_ast.If:               self._compile_If_node,
+            c_ast.While:            self._compile_While_node,
+            c_ast.DoWhile:          self._compile_DoWhile_node,
+            c_ast.For:              self._compile_For_node,
+            c_ast.Continue:         self._compile_Continue_node,
+            c_ast.Break:            self._compile_Break_node,
+            c_ast.EmptyStatement:   self._compile_EmptyStatement_node }
+        self.parse_constant_funcs = {       ## dict(type ast_class: method parse_func), see try_parse_constant()
+            c_ast.Constant:         self._parse_Constant_constant,
+            c_ast.ID:               self._parse_ID_constant,
+            c_ast.UnaryOp:          self._parse_Op_constant,
+            c_ast.BinaryOp:         self._parse_Op_constant }
         if use_cis:
             self.em_instrs = EmulatedInstrs() ## EmulatedInstrs, set of emulated instructions used
 
@@ -671,29 +998,30 @@ class AstCompiler:
     ## Private functions
 
     def push_scope(self):
-        self.scope = self.scope.new_child()
+        self.scopes.append({})
+        self.parsed_terms.clear()
 
     def pop_scope(self):
-        self.scope = self.scope.parents
-
-    def push_loop_tags(self, begin_tag, end_tag):
-        self.loop_tag_stack.append((self.loop_continue_tag, self.loop_break_tag))
-        self.loop_continue_tag = begin_tag
-        self.loop_break_tag = end_tag
-
-    def pop_loop_tags(self):
-        self.loop_continue_tag, self.loop_break_tag = self.loop_tag_stack.pop()
+        symbols = self.symbols
+        for cname, shadowed_symbol in self.scopes.pop().items():
+            if shadowed_symbol is None:
+                del symbols[cname]
+            else:
+                symbols[cname] = shadowed_symbol
+        self.parsed_terms.clear()
 
     def find_symbol(self, cname, filter=None):
-        symbol = self.scope.get(cname, None)
+        symbol = self.symbols.get(cname)
         if symbol is not None and (filter is None or isinstance(symbol, filter)):
             return symbol
         return None
 
     def bind_symbol(self, node, sym_obj):
-        if sym_obj.cname in self.scope.maps[0]:
+        scope = self.scopes[-1]
+        if sym_obj.cname in scope:
             raise PccError(node, f'redefinition of "{sym_obj.cname}"')
-        self.scope.maps[0][sym_obj.cname] = sym_obj
+        scope[sym_obj.cname] = self.symbols.get(sym_obj.cname)
+        self.symbols[sym_obj.cname] = sym_obj
         return sym_obj
 
     def declare_enum(self, enum_decl):
@@ -701,7 +1029,7 @@ class AstCompiler:
         for enum_node in enum_decl.values.enumerators:
             value_node = enum_node.value
             if value_node is None:
-                enum_value = str(enum_cursor)
+                enum_value = int_str(enum_cursor)
                 enum_cursor += 1
             else:
                 const_value = self.try_parse_constant(value_node)
@@ -715,11 +1043,11 @@ class AstCompiler:
         return self.bind_symbol(node, VmVariableSymbol(ctype, cname, asm_var, node, self.context_function))
 
     def declare_parameter(self, node, ctype, cname):
-        m = self.PARAM_PATTERN.fullmatch(cname)
-        if not m:
-            raise PccError(node, 'external variable names must contain one of "p0", "p1", ..., "p9"')
-        vm_param_name = m.groups(0)[0]
-        return self.bind_symbol(node, VmParameterSymbol(ctype, cname, vm_param_name))
+        ## use rightmost "pN" in cname delimited by start/end of cname or "_", e.g. "p3", "led_p3", "p3_led_on"
+        for name_part in reversed(cname.split('_')):
+            if len(name_part) == 2 and name_part[0] == 'p' and name_part[1] in '0123456789':
+                return self.bind_symbol(node, VmParameterSymbol(ctype, cname, name_part))
+        raise PccError(node, 'external variable names must contain one of "p0", "p1", ..., "p9"')
 
     def declare_function(self, node, is_vm_function=False):
         ## return previously bound symbol if exists
@@ -743,41 +1071,109 @@ class AstCompiler:
         return self.bind_symbol(node, FunctionSymbol(func_name, self.functions[func_name]))
 
     def try_parse_constant(self, node):
-        result = None
-        if isinstance(node, c_ast.Constant) and node.type == 'int':
-            result = node.value
-        elif isinstance(node, c_ast.ID):
-            enum_sym = self.find_symbol(node.name, filter=EnumSymbol)
-            if enum_sym is not None:
-                result = enum_sym.const_value
-        elif isinstance(node, c_ast.UnaryOp) and node.op == '-':
-            if isinstance(node.expr, c_ast.Constant):
-                result = str(-int(node.expr.value, 0))
-            elif isinstance(node.expr, c_ast.ID):
-                enum_sym = self.find_symbol(node.expr.name, filter=EnumSymbol)
-                if enum_sym is not None:
-                    result = str(-int(enum_sym.const_value, 0))
-        return result
+        parse_func = self.parse_constant_funcs.get(type(node))
+        return parse_func(node) if parse_func is not None else None
+
+    def _parse_Constant_constant(self, node):
+        return node.value if node.type == 'int' else None
+
+    def _parse_ID_constant(self, node):
+        enum_sym = self.find_symbol(node.name, filter=EnumSymbol)
+        return enum_sym.const_value if enum_sym is not None else None
+
+    def _parse_Op_constant(self, node):
+        const_int = self.fold_constant(node)
+        return int_str(const_int) if const_int is not None else None
+
+    def fold_constant(self, node):
+        ## returns int value of constant expression node wrapped to 32 bit, or None if node is not constant
+        if type(node) in (c_ast.UnaryOp, c_ast.BinaryOp):
+            node_id = id(node)
+            if node_id not in self.folded_constants:
+                self.folded_constants[node_id] = self._fold_op_node(node)
+            return self.folded_constants[node_id]
+        const_value = self.try_parse_constant(node)
+        const_int = c_int_value(const_value) if const_value is not None else None
+        return int32(const_int) if const_int is not None else None
+
+    def _fold_op_node(self, node):
+        if type(node) is c_ast.UnaryOp:
+            fold_op = self.UNARY_OP_FOLD.get(node.op)
+            if fold_op is None:
+                return None
+            const_int = self.fold_constant(node.expr)
+            if const_int is None:
+                return None
+            return int32(int(fold_op(const_int)))
+        else:
+            fold_op = self.BINARY_OP_FOLD.get(node.op)
+            if fold_op is None:
+                return None
+            lhs_int = self.fold_constant(node.left)
+            if lhs_int is None:
+                return None
+            if node.op in self.LOGICAL_OPS and (lhs_int != 0) == (node.op == '||'):
+                return int(lhs_int != 0)                ## short-circuit: (0 && rhs) is 0, (x || rhs) is 1
+            rhs_int = self.fold_constant(node.right)
+            if rhs_int is None:
+                return None
+            const_int = fold_op(lhs_int, rhs_int)
+            return int32(int(const_int)) if const_int is not None else None
 
     def try_parse_term(self, node):
+        node_id = id(node)
+        if node_id in self.parsed_terms:
+            return self.parsed_terms[node_id]
         result = self.try_parse_constant(node)
-        if result is None and isinstance(node, c_ast.ID):
-            var_sym = self.find_symbol(node.name, filter=VariableSymbol)
-            if var_sym is None:
-                raise PccError(node, f'undeclared variable "{node.name}"')
-            result = var_sym.asm_repr()
+        if result is None:
+            if type(node) is c_ast.ID:
+                var_sym = self.find_symbol(node.name, filter=VariableSymbol)
+                if var_sym is None:
+                    raise PccError(node, f'undeclared variable "{node.name}"')
+                result = var_sym.asm_repr()
+            elif type(node) is c_ast.UnaryOp and node.op == '+':
+                result = self.try_parse_term(node.expr)     ## "+x" is "x"
+        self.parsed_terms[node_id] = result
         return result
 
+    def is_side_effect_free(self, node):
+        if type(node) in (c_ast.Constant, c_ast.ID):
+            return True
+        elif type(node) is c_ast.UnaryOp:
+            return node.op in self.UNARY_OP_FOLD and self.is_side_effect_free(node.expr)
+        elif type(node) is c_ast.BinaryOp:
+            return self.is_side_effect_free(node.left) and self.is_side_effect_free(node.right)
+        return False
+
+    def split_constant_addend(self, node):
+        ## returns tuple(node base_node, int addend) with (node-expr) == (base-expr) + addend, sums up the
+        ## constant rhs of nested "+" and "-" ops, e.g. (x + 40 - 1) is (x) + 39
+        addend = 0
+        while type(node) is c_ast.BinaryOp and node.op in self.ADDITIVE_OPS:
+            rhs_int = self.fold_constant(node.right)
+            if rhs_int is None:
+                break
+            addend += rhs_int if node.op == '+' else -rhs_int
+            node = node.left
+        return node, int32(addend)
+
+    def can_reorder_operands(self, node):
+        ## True if binary op node's rhs may be evaluated before its lhs term: either lhs is a
+        ## constant or rhs cannot modify lhs (order of evaluation is unspecified in C)
+        if self.try_parse_term(node.left) is None:
+            return False
+        return self.try_parse_constant(node.left) is not None or self.is_side_effect_free(node.right)
+
     ## Code-generating functions
 
     def compile_expression(self, node):
         node_term = self.try_parse_term(node)
         if node_term is not None:
             if self.use_cis:
-                self.asm_out('LDA', node_term)          ## CIS: A := (node-expr), F := undef
+                self.asm_out.emit('LDA', node_term)     ## CIS: A := (node-expr), F := undef
             else:
-                self.asm_out('LDAF', node_term)         ## EIS: A := (node-expr), F := A
-        elif isinstance(node, (c_ast.UnaryOp, c_ast.BinaryOp, c_ast.Assignment, c_ast.FuncCall)):
+                self.asm_out.emit('LDAF', node_term)    ## EIS: A := (node-expr), F := A
+        elif type(node) in self.EXPRESSION_NODES:
             prev_in_expression = self.in_expression
             self.in_expression = True
             try:
@@ -787,42 +1183,103 @@ class AstCompiler:
         else:
             raise PccError(node, 'unsupported expression syntax')
 
+    def compile_discarded_expression(self, node):
+        if type(node) is c_ast.ExprList:
+            for expr_node in node.exprs:
+                self.compile_discarded_expression(expr_node)
+        elif type(node) in self.EXPRESSION_NODES:
+            self.compile_statement(node)                ## (node-expr) with result discarded
+        else:
+            self.compile_expression(node)               ## A := (node-expr); F := undef/A (CIS/EIS)
+
     def compile_assignment(self, dst_reg, rhs_node, assign_op='='):
+        asm_out = self.asm_out
         rhs_term = self.try_parse_term(rhs_node)
         if assign_op == '=':                            ## Simple assignment ("=")
             if rhs_term is not None:
-                self.asm_out('LD', dst_reg, rhs_term)   ## dst_reg := (rhs-term)
+                asm_out.emit('LD', dst_reg, rhs_term)        ## dst_reg := (rhs-term)
                 if self.in_expression:
                     if self.use_cis:
-                        self.asm_out('LDA', dst_reg)    ## CIS: A := dst_reg; F := undef
+                        asm_out.emit('LDA', dst_reg)         ## CIS: A := dst_reg; F := undef
                     else:
-                        self.asm_out('LDAF', dst_reg)   ## EIS: A := dst_reg; F := A
+                        asm_out.emit('LDAF', dst_reg)        ## EIS: A := dst_reg; F := A
             else:
                 self.compile_expression(rhs_node)       ## A := (rhs-expr); F := undef/A (CIS/EIS)
-                self.asm_out('STA', dst_reg)            ## dst_reg := A
-        elif assign_op[:-1] in self.BINARY_OP_INSTR:    ## Assignment operator ("+=", "/=", ...)
-            op_instr = self.BINARY_OP_INSTR[assign_op[:-1]]
+                asm_out.emit('STA', dst_reg)            ## dst_reg := A
+        else:                                           ## Assignment operator ("+=", "/=", ...)
+            op_instrs = self.ASSIGN_OP_INSTR.get(assign_op)
+            if op_instrs is None:
+                raise PccError(rhs_node, f'unsupported assignment operator "{assign_op}"')
+            op_instr, is_commutative = op_instrs
             if rhs_term is not None:
-                op_rhs = rhs_term
+                asm_out.emit('LDA', dst_reg)            ## A := dest_reg
+                asm_out.emit(op_instr, rhs_term)        ## A := A <OP> x; F := A
+            elif is_commutative:                        ## commutative <OP>
+                self.compile_expression(rhs_node)       ## A := (rhs-expr); F := undef/A (CIS/EIS)
+                asm_out.emit(op_instr, dst_reg)         ## A := (rhs-expr) <OP> dst_reg; F := A
             else:
                 self.compile_expression(rhs_node)       ## A := (rhs-expr); F := undef/A (CIS/EIS)
-                self.asm_out('STA', SCR0)               ## SCR0 := A
-                op_rhs = SCR0
-            self.asm_out('LDA', dst_reg)                ## A := dest_reg
-            self.asm_out(op_instr, op_rhs)              ## A := A <OP> op_rhs; F := A
-            self.asm_out('STA', dst_reg)                ## dst_reg := A
-        else:
-            raise PccError(rhs_node, f'unsupported assignment operator "{assign_op}"')
+                asm_out.emit('STA', SCR0)               ## SCR0 := A
+                asm_out.emit('LDA', dst_reg)            ## A := dest_reg
+                asm_out.emit(op_instr, SCR0)            ## A := A <OP> SCR0; F := A
+            asm_out.emit('STA', dst_reg)                ## dst_reg := A
+
+    def compile_condition(self, node, jump_tag, jump_if=False):
+        ## emit conditional jump to jump_tag that is taken if (node-expr) evaluates to bool jump_if
+        asm_out = self.asm_out
+        if type(node) is c_ast.BinaryOp and node.op in self.LOGICAL_OPS and self.fold_constant(node) is None:
+            if (node.op == '||') == jump_if:
+                ## (lhs || rhs) == TRUE, (lhs && rhs) == FALSE: jump if lhs or else rhs evaluates to jump_if
+                self.compile_condition(node.left, jump_tag, jump_if)
+                self.compile_condition(node.right, jump_tag, jump_if)
+            else:
+                ## (lhs && rhs) == TRUE, (lhs || rhs) == FALSE: jump if both lhs and rhs evaluate to jump_if
+                skip_tag = AsmTag()
+                self.compile_condition(node.left, skip_tag, not jump_if)
+                self.compile_condition(node.right, jump_tag, jump_if)
+                asm_out('TAG', skip_tag)
+            return
+        if self.use_cis and type(node) is c_ast.BinaryOp and node.op in self.NEGATED_COMPARE_OP:
+            cmp_op = self.NEGATED_COMPARE_OP[node.op] if jump_if else node.op
+            lhs_node, rhs_node = node.left, node.right
+            if self.try_parse_term(rhs_node) is None and self.can_reorder_operands(node):
+                ## (x <op> rhs-expr) is (rhs-expr <swapped-op> x), compare without saving lhs
+                lhs_node, rhs_node = rhs_node, lhs_node
+                cmp_op = self.SWAPPED_BINARY_OP[cmp_op]
+            rhs_term = None
+            if cmp_op == '<=':
+                rhs_int = self.fold_constant(rhs_node)
+                if rhs_int is not None and rhs_int < 0x7fffffff:
+                    cmp_op, rhs_term = '<', int_str(rhs_int + 1)    ## (A <= x) is (A < x+1) for constant x
+            if cmp_op in self.COMPARE_FALSE_JUMPS:
+                self.compile_expression(lhs_node)               ## A := (lhs-expr); F := undef
+                if rhs_term is None:
+                    rhs_term = self.try_parse_term(rhs_node)
+                if rhs_term is not None:
+                    asm_out.emit('CMP', rhs_term)               ## F := A - x
+                else:
+                    asm_out.emit('PUSHA')                       ## save ACC (lhs) onto stack
+                    self.compile_expression(rhs_node)           ## A := (rhs-expr); F := undef
+                    asm_out.emit('STA', SCR0)                   ## SCR0 := A
+                    asm_out.emit('POPA')                        ## restore lhs in ACC from stack
+                    asm_out.emit('CMP', SCR0)                   ## F := A - SCR0
+                for jump_instr in self.COMPARE_FALSE_JUMPS[cmp_op]:
+                    asm_out(jump_instr, jump_tag)               ## (A <cmp_op> x) == FALSE: GOTO jump_tag
+                return
+        self.compile_expression(node)                           ## A := (expr); F := undef/A (CIS/EIS)
+        if self.use_cis and not asm_out.flag_is_acc():
+            asm_out('OR', 0, comment='F=A')                     ## CIS: assert F := A before conditional jump
+        asm_out('JNZ' if jump_if else 'JZ', jump_tag)           ## A == jump_if: GOTO jump_tag
 
     def compile_asm_statement(self, node):
-        if node.args is None or not isinstance(node.args, c_ast.ExprList) or len(node.args.exprs) == 0:
+        if node.args is None or type(node.args) is not c_ast.ExprList or len(node.args.exprs) == 0:
             return False
         ## parse arguments into instr_args[]
         instr_args = []
         is_1st_arg_str = False
         for i_arg, arg_expr in enumerate(node.args.exprs):
             arg_term = self.try_parse_term(arg_expr)
-            if arg_term is None and isinstance(arg_expr, c_ast.Constant) and arg_expr.type == 'string':
+            if arg_term is None and type(arg_expr) is c_ast.Constant and arg_expr.type == 'string':
                 arg_term = bytes(arg_expr.value[1:-1], 'utf-8').decode('unicode_escape')
                 if i_arg == 0:
                     is_1st_arg_str = True
@@ -831,9 +1288,9 @@ class AstCompiler:
             instr_args.append(arg_term)
         if not is_1st_arg_str:
             raise PccError(node.args.exprs[0], 'asm() expects first argument to be a string constant')
-        instr = instr_args.pop(0).upper()
+        instr = sys.intern(instr_args.pop(0).upper())   ## share the str object of the compiler's own literals
         ## replace user-defined static TAG labels with AsmTag objects
-        if AsmCmd.tag_instr_idx(instr) >= 0:
+        if instr in TAG_INSTRS:
             if len(instr_args) != 1:
                 raise PccError(node, f'{instr} expects a single tag label argument')
             tag_label = instr_args[0]
@@ -847,40 +1304,47 @@ class AstCompiler:
         return instr in ('RET', 'HALT')
 
     def compile_statement(self, node):
-        ast_class_name = node.__class__.__name__
-        _compile_class_node = getattr(self, f'_compile_{ast_class_name}_node', None)
-        if not callable(_compile_class_node):
-            raise PccError(node, f'unsupported statement syntax (AST element {ast_class_name})')
-        return _compile_class_node(node)
+        compile_func = self.compile_node_funcs.get(type(node))
+        if compile_func is None:
+            raise PccError(node, f'unsupported statement syntax (AST element {node.__class__.__name__})')
+        return compile_func(node)
 
     def _compile_UnaryOp_node(self, node):
+        asm_out = self.asm_out
         if node.op in ('++', '--', 'p++', 'p--'):
-            if not isinstance(node.expr, c_ast.ID):
+            if type(node.expr) is not c_ast.ID:
                 raise PccError(node, 'increment operator expects variable')
             reg_sym = self.find_symbol(node.expr.name, filter=VariableSymbol)
             if reg_sym is None:
                 raise PccError(node.expr, f'undefined variable "{node.expr.name}"')
             vm_reg = reg_sym.asm_repr()
-            if node.op == '++':                         ## Prefix increment "++X":
-                self.asm_out('INR', vm_reg)             ## ++X, F := X
-                self.asm_out('LDA', vm_reg)             ## A := X, F := A
+            if not self.in_expression:                  ## "++X", "X++", "--X", "X--" with result discarded:
+                asm_out.emit('INR' if node.op[-1] == '+' else 'DCR', vm_reg) ## ++X or --X, F := X
+            elif node.op == '++':                       ## Prefix increment "++X":
+                asm_out.emit('INR', vm_reg)             ## ++X, F := X
+                asm_out.emit('LDA', vm_reg)             ## A := X, F := A
             elif node.op == '--':                       ## Prefix deccrement "--X":
-                self.asm_out('DCR', vm_reg)             ## --X, F := X
-                self.asm_out('LDA', vm_reg)             ## A := X, F := A
+                asm_out.emit('DCR', vm_reg)             ## --X, F := X
+                asm_out.emit('LDA', vm_reg)             ## A := X, F := A
             elif node.op == 'p++':                      ## Postfix increment "X++":
-                self.asm_out('LD', SCR0, vm_reg)        ## SCR0 := X
-                self.asm_out('INR', vm_reg)             ## ++X, F := X
                 if self.use_cis:
-                    self.asm_out('LDA', SCR0)           ## CIS: A := SCR0, F := undef
+                    asm_out.emit('LDA', vm_reg)         ## CIS: A := X, F := undef
+                    asm_out.emit('INR', vm_reg)         ## ++X, F := X (F is undef for the caller)
                 else:
-                    self.asm_out('LDAF', SCR0)          ## EIS: A := SCR0, F := A
+                    asm_out.emit('LD', SCR0, vm_reg)    ## SCR0 := X
+                    asm_out.emit('INR', vm_reg)         ## ++X, F := X
+                    asm_out.emit('LDAF', SCR0)          ## EIS: A := SCR0, F := A
             elif node.op == 'p--':                      ## Postfix decrement "X--":
-                self.asm_out('LD', SCR0, vm_reg)        ## SCR0 := X
-                self.asm_out('DCR', vm_reg)             ## --X, F := X
                 if self.use_cis:
-                    self.asm_out('LDA', SCR0)           ## CIS: A := SCR0; F := undef
+                    asm_out.emit('LDA', vm_reg)         ## CIS: A := X; F := undef
+                    asm_out.emit('DCR', vm_reg)         ## --X, F := X (F is undef for the caller)
                 else:
-                    self.asm_out('LDAF', SCR0)          ## EIS: A := SCR0; F := A
+                    asm_out.emit('LD', SCR0, vm_reg)    ## SCR0 := X
+                    asm_out.emit('DCR', vm_reg)         ## --X, F := X
+                    asm_out.emit('LDAF', SCR0)          ## EIS: A := SCR0; F := A
+        elif node.op == '-' and self.use_cis and self.try_parse_term(node.expr) is not None:
+            asm_out.emit('LDA', 0)                      ## A := 0
+            asm_out.emit('SUB', self.try_parse_term(node.expr)) ## CIS: A := 0 - x; F := A
         elif node.op in self.UNARY_OP_INSTR:
             self.compile_expression(node.expr)          ## A := (expr); F := undef/A (CIS/EIS)
             op_instr = self.UNARY_OP_INSTR[node.op]
@@ -888,36 +1352,79 @@ class AstCompiler:
                 if self.use_cis:
                     self.em_instrs.compile(self, op_instr) ## CIS: A := <OP> A; F := undef
                 else:
-                    self.asm_out(op_instr)              ## EIS: A := <OP> A; F := A
+                    asm_out.emit(op_instr)              ## EIS: A := <OP> A; F := A
         else:
             raise PccError(node, f'unsupported unary operator "{node.op}"')
         return False
 
     def _compile_BinaryOp_node(self, node):
-        if node.op not in self.BINARY_OP_INSTR:
+        asm_out = self.asm_out
+        op_instrs = self.binary_op_instrs.get(node.op)
+        if op_instrs is None:
             raise PccError(node, f'unsupported binary operator "{node.op}"')
-        op_instr = self.BINARY_OP_INSTR[node.op]
+        op_instr, is_emulated = op_instrs
+        if node.op in self.LOGICAL_OPS and (is_emulated or not self.is_side_effect_free(node.right)):
+            ## short-circuit evaluation, rhs is only evaluated if lhs does not determine the result
+            false_tag = AsmTag()
+            end_tag = AsmTag()
+            load_instr = 'LDA' if self.use_cis else 'LDAF'
+            self.compile_condition(node, false_tag)     ## (node-expr) == FALSE: GOTO false_tag
+            asm_out.emit(load_instr, 1)                 ## A := 1; F := undef/A (CIS/EIS)
+            asm_out('JMP', end_tag)                     ## GOTO end_tag
+            asm_out('TAG', false_tag)                   ## TAG: false_tag
+            asm_out.emit(load_instr, 0)                 ## A := 0; F := undef/A (CIS/EIS)
+            asm_out('TAG', end_tag)                     ## TAG: end_tag
+            return False
+        if node.op in self.ADDITIVE_OPS:
+            base_node, addend = self.split_constant_addend(node)
+            if base_node is not node:
+                ## constant operands of (lhs-expr +/- x +/- y ...) are added up at compile time
+                self.compile_expression(base_node)      ## A := (base-expr); F := undef/A (CIS/EIS)
+                if addend < 0 and addend != -0x80000000:
+                    asm_out.emit('SUB', int_str(-addend))       ## CIS/EIS: A := A - (-addend), F := A
+                elif addend != 0:
+                    asm_out.emit('ADD', int_str(addend))        ## CIS/EIS: A := A + addend, F := A
+                return False
+        rhs_term = self.try_parse_term(node.right)
+        if rhs_term is None and self.can_reorder_operands(node):
+            ## lhs is a term: evaluate rhs first and avoid saving lhs on the stack
+            lhs_term = self.try_parse_term(node.left)
+            swapped_op = self.SWAPPED_BINARY_OP.get(node.op)
+            if swapped_op is not None:
+                op_instr, is_emulated = self.binary_op_instrs[swapped_op]
+                self.compile_expression(node.right)     ## A := (rhs-expr); F := undef/A (CIS/EIS)
+                self.compile_binary_op_term(op_instr, is_emulated, lhs_term)
+                return False
+            elif not is_emulated:
+                self.compile_expression(node.right)     ## A := (rhs-expr); F := undef/A (CIS/EIS)
+                asm_out.emit('STA', SCR0)               ## SCR0 := A
+                asm_out.emit('LDA', lhs_term)           ## A := lhs
+                asm_out.emit(op_instr, SCR0)            ## CIS/EIS: A := A <OP> SCR0, F := A
+                return False
         ## compile left-hand side (lhs) into ACC
         self.compile_expression(node.left)              ## A := (lhs-expr); F := undef/A (CIS/EIS)
         ## compile right-hand side (rhs) and combine with lhs using <OP>
-        rhs_term = self.try_parse_term(node.right)
         if rhs_term is not None:
-            if self.use_cis and self.em_instrs.is_emulated(op_instr):
-                self.asm_out('LD', SCR0, rhs_term)
-                self.em_instrs.compile(self, op_instr)  ## CIS: A := A <OP> x; F := undef
-            else:
-                self.asm_out(op_instr, rhs_term)        ## CIS/EIS: A := A <OP> x, F := A
+            self.compile_binary_op_term(op_instr, is_emulated, rhs_term)
         else:
-            self.asm_out('PUSHA')                       ## save ACC (lhs) onto stack
+            asm_out.emit('PUSHA')                       ## save ACC (lhs) onto stack
             self.compile_expression(node.right)         ## A := (rhs-expr); F := undef/A (CIS/EIS)
-            self.asm_out('STA', SCR0)                   ## SCR0 := A
-            self.asm_out('POPA')                        ## restore lhs in ACC from stack
-            if self.use_cis and self.em_instrs.is_emulated(op_instr):
+            asm_out.emit('STA', SCR0)                   ## SCR0 := A
+            asm_out.emit('POPA')                        ## restore lhs in ACC from stack
+            if is_emulated:
                 self.em_instrs.compile(self, op_instr)  ## CIS: A := A <OP> SCR0; F := undef
             else:
-                self.asm_out(op_instr, SCR0)            ## CIS/EIS: A := A <OP> SCR0, F := A
+                asm_out.emit(op_instr, SCR0)            ## CIS/EIS: A := A <OP> SCR0, F := A
         return False
 
+    def compile_binary_op_term(self, op_instr, is_emulated, term):
+        asm_out = self.asm_out
+        if is_emulated:
+            asm_out.emit('LD', SCR0, term)
+            self.em_instrs.compile(self, op_instr)      ## CIS: A := A <OP> x; F := undef
+        else:
+            asm_out.emit(op_instr, term)                ## CIS/EIS: A := A <OP> x, F := A
+
     def _compile_Assignment_node(self, node):
         lhs_sym = self.find_symbol(node.lvalue.name, filter=VariableSymbol)
         if lhs_sym is None:
@@ -940,7 +1447,7 @@ class AstCompiler:
                         s_returned = self.compile_statement(statement_node)
                         if s_returned:
                             returned = True
-                        if s_returned or isinstance(statement_node, (c_ast.Continue, c_ast.Break)):
+                        if s_returned or type(statement_node) in (c_ast.Continue, c_ast.Break):
                             in_unreachable_code = True
                     except PccError as e:
                         self.log.error(e, context_function=self.context_function)
@@ -957,7 +1464,7 @@ class AstCompiler:
             self.log.warning(node, 'function should return a value', self.context_function)
         elif ret_val_given:
             self.compile_expression(node.expr)          ## A := (expr); F := A
-        self.asm_out('RET')
+        self.asm_out.emit('RET')
         return True
 
     def _compile_Decl_node(self, node):
@@ -969,15 +1476,17 @@ class AstCompiler:
                 raise PccError(node, f'unsupported storage qualifier "{" ".join(node.storage)}"')
             is_extern = True
         decl_type = node.type
-        if isinstance(decl_type, c_ast.TypeDecl):
+        decl_class = type(decl_type)
+        if decl_class is c_ast.TypeDecl:
             if len(decl_type.quals) != 0:
                 raise PccError(node, f'unsupported type qualifier "{" ".join(decl_type.quals)}"')
-            if isinstance(decl_type.type, c_ast.IdentifierType):
+            var_class = type(decl_type.type)
+            if var_class is c_ast.IdentifierType:
                 if len(decl_type.type.names) == 1 and decl_type.type.names[0] in ('int', 'long'):
                     var_ctype = decl_type.type.names[0]
                 else:
                     raise PccError(node, f'unsupported variable type "{" ".join(decl_type.type.names)}"')
-            elif isinstance(decl_type.type, c_ast.Enum):
+            elif var_class is c_ast.Enum:
                 self.declare_enum(decl_type.type)
                 var_ctype = 'int'
             else:
@@ -989,9 +1498,9 @@ class AstCompiler:
                 var_sym = self.declare_variable(node, var_ctype, var_cname)
             if node.init is not None:
                 self.compile_assignment(var_sym.asm_repr(), node.init)
-        elif isinstance(decl_type, c_ast.FuncDecl):
+        elif decl_class is c_ast.FuncDecl:
             self.declare_function(node, is_vm_function=is_extern)
-        elif isinstance(decl_type, c_ast.Enum):
+        elif decl_class is c_ast.Enum:
             self.declare_enum(decl_type)
         else:
             raise PccError(node, 'unsupported declaration syntax')
@@ -1023,7 +1532,7 @@ class AstCompiler:
             if not returned:
                 if function.has_return:
                     self.log.warning(node, 'function should return a value', function)
-                self.asm_out('RET')
+                self.asm_out.emit('RET')
         except PccError as e:
             self.log.error(e, context_function=function)
         finally:
@@ -1042,22 +1551,23 @@ class AstCompiler:
         function = func_sym.function
         if self.in_expression and not function.has_return:
             raise PccError(node, 'function declared without return value')
-        arg_exprs = node.args.exprs if node.args is not None else []
+        arg_exprs = node.args.exprs if node.args is not None else ()
         if function.arg_count != len(arg_exprs):
             raise PccError(node, f'function expects {function.arg_count} argument(s) instead of {len(arg_exprs)}')
         returned = False
         if isinstance(function, VmApiFunction):                                     ## compile call to VM API function
-            asm_args = []
+            asm_args = [None] * len(arg_exprs)
+            map_argument = function.map_argument if self.use_cis else None
             for i_arg, arg_expr_node in enumerate(arg_exprs):
                 arg_term = None
-                if self.use_cis and function.map_argument is not None:
-                    arg_term = function.map_argument(arg_expr_node, i_arg, self.try_parse_constant(arg_expr_node))
+                if map_argument is not None:
+                    arg_term = map_argument(arg_expr_node, i_arg, self.try_parse_constant(arg_expr_node))
                 if arg_term is None:
                     arg_term = self.try_parse_term(arg_expr_node)
                     if arg_term is None:
                         arg_term = ARG_REGS[i_arg]
                         self.compile_assignment(arg_term, arg_expr_node)
-                asm_args.append(arg_term)
+                asm_args[i_arg] = arg_term
             asm_instr = func_sym.asm_repr()
             self.asm_out(asm_instr, *asm_args, comment=f'{func_name}();')           ## A := vm_api_func(); F := A
             if asm_instr == 'HALT':
@@ -1065,113 +1575,166 @@ class AstCompiler:
         else:                                                                       ## compile call to user defined function
             if function is not self.context_function:
                 function.caller.add(self.context_function.func_name)
-            for i_arg, arg_expr_node in enumerate(arg_exprs):
-                self.compile_assignment(function.arg_vars[i_arg], arg_expr_node)
+            for arg_var, arg_expr_node in zip(function.arg_vars, arg_exprs):
+                self.compile_assignment(arg_var, arg_expr_node)
             self.asm_out('CALL', func_sym.asm_repr(), comment=f'{func_name}();')    ## A := user_func(); F := undef/A (CIS/EIS)
         return returned
 
     def _compile_If_node(self, node):
+        asm_out = self.asm_out
+        cond_int = self.fold_constant(node.cond)
+        if cond_int is not None:
+            ## constant condition: compile the taken branch only
+            if cond_int != 0:
+                returned = self.compile_statement(node.iftrue)  ## compile if-branch statement(s)
+                if node.iffalse is not None:
+                    self.compile_unreachable(AsmTag(), node.iffalse)
+            else:
+                self.compile_unreachable(AsmTag(), node.iftrue)
+                returned = node.iffalse is not None and self.compile_statement(node.iffalse)
+            return returned
         else_tag = AsmTag() if node.iffalse is not None else None
         endif_tag = AsmTag()
-        self.compile_expression(node.cond)                  ## A := (cond); F := undef/A (CIS/EIS)
-        if self.use_cis:
-            self.asm_out('OR', 0, comment='F=A')            ## CIS: assert F := A before conditional jump
         if else_tag is None:
-            self.asm_out('JZ', endif_tag)                   ## NOT A AND no-else-branch: GOTO endif_tag
+            self.compile_condition(node.cond, endif_tag)    ## cond == FALSE AND no-else-branch: GOTO endif_tag
         else:
-            self.asm_out('JZ', else_tag)                    ## NOT A AND has-else-branch: GOTO else_tag
+            self.compile_condition(node.cond, else_tag)     ## cond == FALSE AND has-else-branch: GOTO else_tag
         r1 = self.compile_statement(node.iftrue)            ## compile if-branch statement(s)
         r2 = False
         if else_tag is not None:
             if not r1:                                      ## omit the following JMP when if-branch returned (RET)
-                self.asm_out('JMP', endif_tag)              ## has-else-branch: GOTO endif_tag
-            self.asm_out('TAG', else_tag)                   ## TAG: else_tag
+                asm_out('JMP', endif_tag)                   ## has-else-branch: GOTO endif_tag
+            asm_out('TAG', else_tag)                        ## TAG: else_tag
             r2 = self.compile_statement(node.iffalse)       ## compile else-branch
-        self.asm_out('TAG', endif_tag)                      ## TAG: endif_tag
+        asm_out('TAG', endif_tag)                           ## TAG: endif_tag
         return r1 and r2
 
     def _compile_While_node(self, node):
+        ## rotated loop: the condition is tested at the bottom, entered once through a JMP
+        asm_out = self.asm_out
         begin_tag = AsmTag()
+        cond_tag = AsmTag()
         end_tag = AsmTag()
-        self.push_loop_tags(begin_tag, end_tag)
+        cond_int = self.fold_constant(node.cond)
+        is_endless = cond_int not in (None, 0)
+        prev_continue_tag, prev_break_tag = self.loop_continue_tag, self.loop_break_tag
+        self.loop_continue_tag, self.loop_break_tag = begin_tag if is_endless else cond_tag, end_tag
         try:
-            self.asm_out('TAG', begin_tag)                  ## TAG: begin_tag
-            self.compile_expression(node.cond)              ## A := (cond); F := undef/A (CIS/EIS)
-            if self.use_cis:
-                self.asm_out('OR', 0, comment='F=A')        ## CIS: assert F := A before conditional jump
-            self.asm_out('JZ', end_tag)                     ## cond == FALSE: GOTO end_tag
+            if cond_int == 0:
+                self.loop_continue_tag = end_tag
+                self.compile_unreachable(end_tag, node.stmt)
+                return False
+            if not is_endless:
+                asm_out('JMP', cond_tag)                    ## GOTO cond_tag
+            asm_out('TAG', begin_tag)                       ## TAG: begin_tag
             returned = self.compile_statement(node.stmt)    ## compile statement(s)
-            self.asm_out('JMP', begin_tag)                  ## GOTO begin_tag
-            self.asm_out('TAG', end_tag)                    ## TAG: end_tag
+            if is_endless:
+                asm_out('JMP', begin_tag)                   ## GOTO begin_tag
+            else:
+                asm_out('TAG', cond_tag)                    ## TAG: cond_tag
+                self.compile_condition(node.cond, begin_tag, jump_if=True) ## cond == TRUE: GOTO begin_tag
+            asm_out('TAG', end_tag)                         ## TAG: end_tag
         finally:
-            self.pop_loop_tags()
-        return returned
+            self.loop_continue_tag, self.loop_break_tag = prev_continue_tag, prev_break_tag
+        ## only an endless loop without "break" never ends, a false condition skips a returning body
+        return returned and is_endless and end_tag not in self.loop_jump_tags
 
     def _compile_DoWhile_node(self, node):
+        asm_out = self.asm_out
         begin_tag = AsmTag()
         end_tag = AsmTag()
-        self.push_loop_tags(begin_tag, end_tag)
+        cond_int = self.fold_constant(node.cond)
+        prev_continue_tag, prev_break_tag = self.loop_continue_tag, self.loop_break_tag
+        self.loop_continue_tag, self.loop_break_tag = end_tag if cond_int == 0 else begin_tag, end_tag
         try:
-            self.asm_out('TAG', begin_tag)                  ## TAG: begin_tag
+            if cond_int != 0:
+                asm_out('TAG', begin_tag)                   ## TAG: begin_tag
             returned = self.compile_statement(node.stmt)    ## compile statement(s)
-            self.compile_expression(node.cond)              ## A := (cond); F := undef/A (CIS/EIS)
-            if self.use_cis:
-                self.asm_out('OR', 0, comment='F=A')        ## CIS: assert F := A before conditional jump
-            self.asm_out('JNZ', begin_tag)                  ## cond == TRUE: GOTO begin_tag
-            self.asm_out('TAG', end_tag)                    ## TAG: end_tag
+            if cond_int is None:
+                self.compile_condition(node.cond, begin_tag, jump_if=True) ## cond == TRUE: GOTO begin_tag
+            elif cond_int != 0:
+                asm_out('JMP', begin_tag)                   ## GOTO begin_tag
+            asm_out('TAG', end_tag)                         ## TAG: end_tag
         finally:
-            self.pop_loop_tags()
-        return returned
+            self.loop_continue_tag, self.loop_break_tag = prev_continue_tag, prev_break_tag
+        ## the body runs at least once, its return is only bypassed by a jump to end_tag
+        return returned and end_tag not in self.loop_jump_tags
 
     def _compile_For_node(self, node):
+        ## rotated loop like While, the condition follows the iteration-expression(s)
+        asm_out = self.asm_out
         begin_tag = AsmTag()
         next_tag = AsmTag()
+        cond_tag = AsmTag()
         end_tag = AsmTag()
-        self.push_loop_tags(next_tag, end_tag)
+        cond_int = self.fold_constant(node.cond) if node.cond is not None else 1
+        is_endless = cond_int not in (None, 0)
+        prev_continue_tag, prev_break_tag = self.loop_continue_tag, self.loop_break_tag
+        self.loop_continue_tag, self.loop_break_tag = next_tag, end_tag
         try:
-            needs_local_scope = node.init is not None and isinstance(node.init, c_ast.DeclList)
+            needs_local_scope = type(node.init) is c_ast.DeclList
             if needs_local_scope:
                 self.push_scope()
             try:
                 if node.init is not None:                       ## compile init-clause statement(s)
-                    if isinstance(node.init, c_ast.DeclList):
+                    if type(node.init) is c_ast.DeclList:
                         for decl_node in node.init.decls:
                             self._compile_Decl_node(decl_node)
                     else:
                         self.compile_statement(node.init)
-                self.asm_out('TAG', begin_tag)                  ## TAG: begin_tag
-                if node.cond is not None:
-                    self.compile_expression(node.cond)          ## A := (cond); F := undef/A (CIS/EIS)
-                    if self.use_cis:
-                        self.asm_out('OR', 0, comment='F=A')    ## CIS: assert F := A before conditional jump
-                    self.asm_out('JZ', end_tag)                 ## cond == FALSE: GOTO end_tag
+                if cond_int == 0:
+                    self.loop_continue_tag = end_tag
+                    self.compile_unreachable(end_tag, node.stmt, node.next)
+                    return False
+                if not is_endless:
+                    asm_out('JMP', cond_tag)                    ## GOTO cond_tag
+                asm_out('TAG', begin_tag)                       ## TAG: begin_tag
                 returned = self.compile_statement(node.stmt)    ## compile loop-body statement(s)
-                self.asm_out('TAG', next_tag)                   ## TAG: next_tag
+                asm_out('TAG', next_tag)                        ## TAG: next_tag
                 if node.next is not None:                       ## compile iteration-expression(s)
-                    if isinstance(node.next, c_ast.ExprList):
-                        for expr_node in node.next.exprs:
-                            self.compile_expression(expr_node)  ## A := (next-expr); F := undef/A (CIS/EIS)
-                    else:
-                        self.compile_expression(node.next)      ## A := (next-expr); F := undef/A (CIS/EIS)
-                self.asm_out('JMP', begin_tag)                  ## GOTO begin_tag
-                self.asm_out('TAG', end_tag)                    ## TAG: end_tag
+                    self.compile_discarded_expression(node.next)
+                if is_endless:
+                    asm_out('JMP', begin_tag)                   ## GOTO begin_tag
+                else:
+                    asm_out('TAG', cond_tag)                    ## TAG: cond_tag
+                    self.compile_condition(node.cond, begin_tag, jump_if=True) ## cond == TRUE: GOTO begin_tag
+                asm_out('TAG', end_tag)                         ## TAG: end_tag
             finally:
                 if needs_local_scope:
                     self.pop_scope()
         finally:
-            self.pop_loop_tags()
-        return returned
+            self.loop_continue_tag, self.loop_break_tag = prev_continue_tag, prev_break_tag
+        return returned and is_endless and end_tag not in self.loop_jump_tags   ## see _compile_While_node()
+
+    def compile_unreachable(self, skip_tag, stmt_node, next_node=None):
+        ## compile statement(s) of a branch not taken due to a constant condition into a scratch buffer (to report
+        ## errors) and drop them, unless they define a static asm() TAG label: keep them then, but jump over them
+        asm_out = self.asm_out
+        self.asm_out = AsmBuffer()
+        try:
+            self.compile_statement(stmt_node)
+            if next_node is not None:
+                self.compile_discarded_expression(next_node)
+        finally:
+            dead_asm_buf, self.asm_out = self.asm_out, asm_out
+        static_tags = set(self.context_function.static_asm_tags.values())
+        if any(asm_stmt in static_tags for asm_stmt in dead_asm_buf.stmt_buf if asm_stmt.kind == STMT_TAG):
+            asm_out('JMP', skip_tag)                        ## GOTO skip_tag
+            asm_out.stmt_buf.extend(dead_asm_buf.stmt_buf)
+            asm_out('TAG', skip_tag)                        ## TAG: skip_tag
 
     def _compile_Continue_node(self, node):
         if self.loop_continue_tag is None:
             raise PccError(node, '"continue" outside loop not allowed')
         self.asm_out('JMP', self.loop_continue_tag)
+        self.loop_jump_tags.add(self.loop_continue_tag)
         return False
 
     def _compile_Break_node(self, node):
         if self.loop_break_tag is None:
             raise PccError(node, '"break" outside loop not allowed')
         self.asm_out('JMP', self.loop_break_tag)
+        self.loop_jump_tags.add(self.loop_break_tag)
         return False
 
     def _compile_EmptyStatement_node(self, node):
@@ -1180,25 +1743,39 @@ class AstCompiler:
 ## ---------------------------------------------------------------------------
 
 class CSourceBundle:
+    COMMENT_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*[\s\S]*?\*/')
+
     def read_files(self, filenames):
-        self.c_source_files = {}    ## dict(str filename: list(str line))
+        self.c_source_files = {}    ## dict(str filename: str c_source), source code with normalized line endings
+        self.c_source_lines = {}    ## dict(str filename: list(str line)), c_source_files split into lines on demand
         self.c_segments = []        ## list(tuple(str seg_filename, int flat_idx_start, int flat_idx_end))
         ttl_line_count = 0          ## int, total number of lines
-        c_result = ''               ## str, combined and cleaned source code
+        c_sources = []              ## list(str), source code of each file with normalized line endings
         try:
             for filename in filenames:
                 with open(filename, 'r') as f:
-                    c_source_lines = list(line.rstrip('\r\n') for line in f.readlines())
-                self.c_source_files[filename] = c_source_lines
-                self.c_segments.append((filename, ttl_line_count, ttl_line_count + len(c_source_lines)))
-                ttl_line_count += len(c_source_lines)
-                c_result += '\n'.join(c_source_lines) + '\n'
+                    c_source = f.read()                 ## universal newlines: line endings are '\n'
+                if c_source and not c_source.endswith('\n'):
+                    c_source += '\n'
+                line_count = c_source.count('\n')
+                self.c_source_files[filename] = c_source
+                self.c_segments.append((filename, ttl_line_count, ttl_line_count + line_count))
+                ttl_line_count += line_count
+                c_sources.append(c_source)
         except OSError as e:
             print(str(e), file=sys.stderr)
             return None
-        c_result = re.sub(r'//.*', '', c_result)
-        c_result = re.sub(r'/\*(.|\n)*?\*/', lambda m: re.sub(r'[^\n]', '', m.group(0)), c_result)
-        return c_result
+        return self.COMMENT_PATTERN.sub(self._blank_comment, ''.join(c_sources))
+
+    @staticmethod
+    def _blank_comment(m):
+        ## keep string and char literals, drop line comments, blank block comments preserving line breaks
+        text = m.group(0)
+        if text[0] != '/':
+            return text
+        elif text[1] == '/':
+            return ''
+        return '\n'.join(' ' * len(line) for line in text.split('\n'))
 
     def map_coord(self, flat_row):
         ## map flat_row to (filename, row)
@@ -1210,17 +1787,98 @@ class CSourceBundle:
         return None, flat_row
 
     def line_at(self, filename, row):
-        return self.c_source_files[filename][row-1]
+        c_source_lines = self.c_source_lines.get(filename)
+        if c_source_lines is None:
+            c_source_lines = self.c_source_lines[filename] = self.c_source_files[filename].split('\n')
+        return c_source_lines[row-1]
 
 class PccResult:
-    def __init__(self, var_count, tag_count, asm_code):
+    def __init__(self, var_count, tag_count, asm_lines):
         self.var_count = var_count
         self.tag_count = tag_count
-        self.asm_code = asm_code
+        self.asm_lines = asm_lines      ## callable, returns a new iterator over the assembly code lines
+
+    @property
+    def asm_code(self):
+        return '\n'.join(self.asm_lines())
+
+    def write(self, file):
+        for asm_line in self.asm_lines():
+            file.write(asm_line)
+            file.write('\n')
+
+def format_asm_lines(asm_bufs, asm_vars, c_sources, use_comments):
+    has_lines = False
+    if use_comments:
+        yield '; VM variables:'
+        yield ';'
+        yield ';  v0: reserved: SCR0'
+        yield ';  v1: reserved: ARG0'
+        yield ';  v2: reserved: ARG1'
+        yield ';  v3: reserved: ARG2'
+        for asm_var in asm_vars:
+            var_sym = asm_var.var_sym
+            coord = var_sym.decl_node.coord
+            filename, row = c_sources.map_coord(coord.line)
+            fqname = var_sym.cname
+            if var_sym.context_function is not None:
+                fqname = f'{var_sym.context_function.func_name}.{fqname}'
+            yield f'; {asm_var!s: >3}: ' \
+                  f'{PurePath(filename).name}:{row}:{coord.column}: ' \
+                  f'{var_sym.ctype} {fqname}'
+        has_lines = True
+    for asm_buf in asm_bufs:
+        if has_lines:
+            yield ''
+        for asm_stmt in asm_buf.stmt_buf:
+            asm_line = asm_stmt.format_statement()
+            if use_comments and asm_stmt.comment is not None:
+                asm_line = asm_line.ljust(24) + '; ' + asm_stmt.comment
+            yield asm_line
+            has_lines = True
+
+def coalesce_vm_variables(asm_vars, interference, moves):
+    ## merge the variables of each copy that don't interfere (and are both in asm_vars) into a single node
+    ## of the interference graph, returns dict(AsmVar asm_var: AsmVar merged_into)
+    merged = {}
+    def resolve(asm_var):
+        while asm_var in merged:
+            asm_var = merged[asm_var]
+        return asm_var
+    for dst_var, src_var in moves:
+        dst_var, src_var = resolve(dst_var), resolve(src_var)
+        if dst_var is src_var or dst_var not in asm_vars or src_var not in asm_vars or \
+                src_var in interference.get(dst_var, ()):
+            continue
+        src_edges = interference.pop(src_var, set())
+        for other_var in src_edges:
+            interference[other_var].discard(src_var)
+            interference[other_var].add(dst_var)
+        interference.setdefault(dst_var, set()).update(src_edges)
+        merged[src_var] = dst_var
+    return {asm_var: resolve(asm_var) for asm_var in merged}
+
+@functools.lru_cache(maxsize=None)
+def c_parser():
+    ## shared CParser, constructing one builds pycparser's lexer and parser tables
+    return CParser()
+
+def color_vm_variables(asm_vars, interference, var_id_offset):
+    ## greedy graph coloring (Welsh-Powell): bind each AsmVar to the lowest VM variable id not bound to any
+    ## of its interfering AsmVars, highest degree first; returns the total number of VM variables
+    var_count = var_id_offset
+    for asm_var in sorted(asm_vars, key=lambda asm_var: len(interference.get(asm_var, ())), reverse=True):
+        used_ids = {other_var.vm_var_id for other_var in interference.get(asm_var, ())}
+        var_id = var_id_offset
+        while var_id in used_ids:
+            var_id += 1
+        asm_var.bind(var_id)
+        var_count = max(var_count, var_id + 1)
+    return var_count
 
 def pcc(filenames, use_cis=True, do_reduce=True, use_comments=False, debug=False):
     ## build C translation unit from input files
-    if 'vm_api.h' not in [PurePath(filename).name for filename in filenames]:
+    if not any(PurePath(filename).name == 'vm_api.h' for filename in filenames):
         filenames = [str(Path(__file__).resolve().with_name('vm_api.h'))] + filenames
     c_sources = CSourceBundle()
     c_translation_unit = c_sources.read_files(filenames)
@@ -1230,7 +1888,7 @@ def pcc(filenames, use_cis=True, do_reduce=True, use_comments=False, debug=False
     ## build abstract syntax tree (AST) from C translation unit
     log = PccLogger(c_sources, debug)
     try:
-        ast = CParser().parse(c_translation_unit)
+        ast = c_parser().parse(c_translation_unit)
     except ParseError as e:
         m = re.fullmatch(r'[^:]*?:(\d+):(\d+):\s*(.*)', str(e))
         if m is None:
@@ -1257,22 +1915,19 @@ def pcc(filenames, use_cis=True, do_reduce=True, use_comments=False, debug=False
             else:
                 userdef_functions.append(function)
 
-    ## incrementally drop non-called functions
-    while len(userdef_functions) > 0:
-        functions_passed = []
-        func_names_dropped = set()
-        for function in userdef_functions:
-            if len(function.caller) > 0:
-                functions_passed.append(function)
-            else:
-                func_names_dropped.add(function.func_name)
-        if len(func_names_dropped) == 0:
-            break
-        for function in functions_passed:
-            function.caller -= func_names_dropped
-        userdef_functions = functions_passed
-        if use_cis:
-            astcc.em_instrs.drop_caller(func_names_dropped)
+    ## drop functions not reachable from main()
+    callees = {}                    ## dict(str func_name: list(UserDefFunction function)), functions called by func_name
+    for function in userdef_functions:
+        for caller_name in function.caller:
+            callees.setdefault(caller_name, []).append(function)
+    reachable = set()               ## set(str func_name), names of functions reachable from main()
+    pending = ['main']
+    while len(pending) > 0:
+        for function in callees.get(pending.pop(), ()):
+            if function.func_name not in reachable:
+                reachable.add(function.func_name)
+                pending.append(function.func_name)
+    userdef_functions = [function for function in userdef_functions if function.func_name in reachable]
 
     ## check main and user-defined function definitions
     for function in userdef_functions:
@@ -1286,67 +1941,84 @@ def pcc(filenames, use_cis=True, do_reduce=True, use_comments=False, debug=False
         return None
 
     ## drop unused tags in main and user-defined functions
-    tags = {}   ## dict(AsmTag asm_tag: int use_count), preseed w. user-defined functions
-    for function in userdef_functions:
-        tags[function.asm_tag] = 1
+    func_tags = {function.asm_tag for function in userdef_functions}    ## set(AsmTag asm_tag), function entry tags
     userdef_asm_bufs = [main_function.asm_buf] + [f.asm_buf for f in userdef_functions]
     for asm_buf in userdef_asm_bufs:
-        asm_buf.drop_unused_tags(tags.copy())
+        asm_buf.drop_unused_tags(func_tags)
         if do_reduce:
-            asm_buf.reduce()
+            asm_buf.reduce(func_tags)
+
+    ## drop emulator functions not called from any remaining code
+    if use_cis:
+        astcc.em_instrs.drop_unused([init_asm_buf] + userdef_asm_bufs)
 
     ## merge main() function body into init segment
     main_function.asm_buf.replace_instruction('RET', 'HALT')
     init_asm_buf.stmt_buf.extend(main_function.asm_buf.stmt_buf)
     all_asm_bufs = [init_asm_buf] + userdef_asm_bufs[1:]
+    n_userdef_bufs = len(all_asm_bufs)
     if use_cis:
         all_asm_bufs += astcc.em_instrs.asm_bufs()
 
-    ## bind VM tags and variables
+    ## drop tags orphaned by reduce(), bind VM tags and collect VM variables
+    used_tags = func_tags           ## set(AsmTag asm_tag), tags referenced from outside of their AsmBuffer
     tag_base = 0                    ## int, current AsmBuffer's tag label offset
     tag_count = 0                   ## int, total number of tags
-    global_asm_vars = dict()        ## dict(AsmVar asm_var: any), ordered set of global variables
-    local_asm_vars = dict()         ## dict(AsmVar asm_var: any), ordered set of local variables
-    for asm_buf in all_asm_bufs:
-        n_tags = asm_buf.bind_tags(tag_base)
+    asm_vars = set()                ## set(AsmVar asm_var), all collected variables
+    global_asm_vars = []            ## list(AsmVar asm_var), global variables in order of first use
+    local_asm_vars = []             ## list(AsmVar asm_var), local variables in order of first use
+    for i_buf, asm_buf in enumerate(all_asm_bufs):
+        n_tags, tag_base = asm_buf.finalize(tag_base, asm_vars, global_asm_vars, local_asm_vars,
+            used_tags=used_tags if i_buf < n_userdef_bufs else None)
         tag_count += n_tags
-        tag_base = ((tag_base + n_tags + 10) // 10) * 10
-        asm_buf.collect_vm_variables(global_asm_vars, local_asm_vars)
-    all_asm_vars = list(global_asm_vars.keys()) + list(local_asm_vars.keys())
     var_count = 1 + len(ARG_REGS)   ## int, total number of variables
-    for asm_var in all_asm_vars:
+    for asm_var in global_asm_vars:
         asm_var.bind(var_count)
         var_count += 1
+    if do_reduce:
+        ## local variables with disjoint live ranges share VM variables, a CALL reads the callee's arguments and
+        ## may write any local variable of the functions reachable from the callee
+        func_vars = {}              ## dict(str func_name: set(AsmVar asm_var)), local variables in function's code
+        for function in userdef_functions:
+            func_vars[function.func_name] = {arg for asm_stmt in function.asm_buf.stmt_buf
+                if asm_stmt.kind == STMT_CMD for arg in asm_stmt.args
+                if type(arg) is AsmVar and arg.is_local}
+        call_uses = {}              ## dict(AsmTag func_tag: frozenset(AsmVar asm_var))
+        call_defs = {}              ## dict(AsmTag func_tag: frozenset(AsmVar asm_var))
+        for function in userdef_functions:
+            closure_vars = set()
+            visited = {function.func_name}
+            pending = [function.func_name]
+            while len(pending) > 0:
+                func_name = pending.pop()
+                closure_vars |= func_vars.get(func_name, set())
+                for callee in callees.get(func_name, ()):
+                    if callee.func_name not in visited:
+                        visited.add(callee.func_name)
+                        pending.append(callee.func_name)
+            call_uses[function.asm_tag.find()] = frozenset(function.arg_vars)
+            call_defs[function.asm_tag.find()] = frozenset(closure_vars)
+        interference = {}           ## dict(AsmVar asm_var: set(AsmVar asm_var)), interference graph
+        moves = []                  ## list(tuple(AsmVar dst_var, AsmVar src_var)), variable copies
+        for asm_buf in all_asm_bufs[:n_userdef_bufs]:
+            asm_buf.add_interferences(interference, moves, call_uses, call_defs)
+        merged = coalesce_vm_variables(set(local_asm_vars), interference, moves)
+        var_count = color_vm_variables([asm_var for asm_var in local_asm_vars if asm_var not in merged],
+            interference, var_count)
+        for asm_var, merged_into in merged.items():
+            asm_var.bind(merged_into.vm_var_id)
+        for asm_buf in all_asm_bufs[:n_userdef_bufs]:
+            asm_buf.drop_redundant_moves()
+        local_asm_vars.sort(key=lambda asm_var: asm_var.vm_var_id)
+    else:
+        for asm_var in local_asm_vars:
+            asm_var.bind(var_count)
+            var_count += 1
+    all_asm_vars = global_asm_vars + local_asm_vars
 
-    ## transform intermediate representation into assembly code
-    asm_code = []
-    if use_comments:
-        asm_code.append('; VM variables:')
-        asm_code.append(';')
-        asm_code.append(';  v0: reserved: SCR0')
-        asm_code.append(';  v1: reserved: ARG0')
-        asm_code.append(';  v2: reserved: ARG1')
-        asm_code.append(';  v3: reserved: ARG2')
-        for asm_var in all_asm_vars:
-            var_sym = asm_var.var_sym
-            coord = var_sym.decl_node.coord
-            filename, row = c_sources.map_coord(coord.line)
-            fqname = var_sym.cname
-            if var_sym.context_function is not None:
-                fqname = f'{var_sym.context_function.func_name}.{fqname}'
-            asm_code.append(f'; {asm_var!s: >3}: '
-                   f'{PurePath(filename).name}:{row}:{coord.column}: '
-                   f'{var_sym.ctype} {fqname}')
-    for asm_buf in all_asm_bufs:
-        if len(asm_code) > 0:
-            asm_code.append('')
-        for asm_stmt in asm_buf.stmt_buf:
-            asm_line = asm_stmt.format_statement()
-            if use_comments and asm_stmt.comment is not None:
-                asm_line = f'{asm_line: <24}; {asm_stmt.comment}'
-            asm_code.append(asm_line)
-
-    return PccResult(var_count, tag_count, '\n'.join(asm_code))
+    ## transform intermediate representation into assembly code (lazily)
+    return PccResult(var_count, tag_count,
+        lambda: format_asm_lines(all_asm_bufs, all_asm_vars, c_sources, use_comments))
 
 ## ---------------------------------------------------------------------------
 
@@ -1369,10 +2041,10 @@ def main():
     if out_filename is None:
         out_filename = PurePath(args.filenames[-1]).stem + '.s'
     if out_filename == '-':
-        print(cc_result.asm_code, file=sys.stdout)
+        cc_result.write(sys.stdout)
     else:
         with open(out_filename, 'w') as f:
-            print(cc_result.asm_code, file=f)
+            cc_result.write(f)
     print(f'\nVM variables used: {cc_result.var_count}/150, tags: {cc_result.tag_count}/50.', file=sys.stderr)
     return 0
 
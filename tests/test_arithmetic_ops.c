@@ -59,6 +59,10 @@ int test_arithmetic_ops1(void)
         return -14;
     }
 
+    if (-7 / 2 != -3 | -7 % 2 != -1 | (2 + 3) * 4 - ~0 != 21) {
+        return -15;
+    }
+
     return 1;
 }
 
@@ -136,6 +140,11 @@ int test_arithmetic_ops2(void)
         return -14;
     }
 
+    a = -7;
+    if (a / 2 != -3 | a % 2 != -1 | (a + 12) * 4 - ~0 != 21 | a + 40 - 1 - -3 != 35) {
+        return -15;
+    }
+
     return 2;
 }
 
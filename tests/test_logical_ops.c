@@ -153,9 +153,30 @@ int test_logical_ops3(void)
     return 3;
 }
 
+int test_logical_ops4(void)
+{
+    int a, b;
+
+    a = 0; b = 0;
+    if (a && ++b) {
+        return -1;
+    }
+
+    if ((a || ++b) != 1) {
+        return -2;
+    }
+
+    if (b != 1) {
+        return -3;
+    }
+
+    return 4;
+}
+
 void main()
 {
     p0 = test_logical_ops1();
     p1 = test_logical_ops2();
     p2 = test_logical_ops3();
+    p3 = test_logical_ops4();
 }
@@ -0,0 +1,95 @@
+// test_loop_conditions.c
+// Test C loops with constant conditions and conditions that leave the flags set
+
+int test_loop_conditions1()
+{
+    int i = 0, z;
+
+    for (z = 5; 0; ++z) {
+        ++i;
+    }
+    do {
+        ++i;
+        if (i == 1) {
+            continue;
+        }
+        i = 10;
+    } while (0);
+    if ((i != 1) || (z != 5)) {
+        return -1;
+    }
+
+    return 1;
+}
+
+int test_loop_conditions2()
+{
+    int i = 3, z = 0;
+
+    while (--i) {
+        z = z + i;
+    }
+    while (z = z - 1) {
+        i = i + 2;
+    }
+    if ((i != 4) || (z != 0)) {
+        return -1;
+    }
+
+    return 2;
+}
+
+int test_loop_conditions3()
+{
+    int i = 0;
+
+    while (i < 0) {
+        ++i;
+        if (1) {
+            return -1;
+        }
+    }
+    for (; i > 0;) {
+        if (9 > 5) {
+            return -2;
+        }
+    }
+    do {
+        if (i == 0) {
+            break;
+        }
+        if (1) {
+            return -3;
+        }
+    } while (1);
+
+    return 3;
+}
+
+int loop_count;
+
+void count_while()
+{
+    while (loop_count < 3) {
+        loop_count = loop_count + 1;
+    }
+}
+
+int count_for()
+{
+    for (; loop_count < 10; ++loop_count) {
+        loop_count = loop_count + 1;
+    }
+    return loop_count;
+}
+
+void main()
+{
+    p0 = test_loop_conditions1();
+    p1 = test_loop_conditions2();
+    p2 = test_loop_conditions3();
+    // functions starting with a loop, called from main() which is reduced first
+    count_while();
+    p3 = loop_count;
+    p4 = count_for();
+}
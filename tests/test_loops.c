@@ -137,6 +137,22 @@ int test_loop7()
     return 1;
 }
 
+int test_loop8(int spin)
+{
+    if (spin == 1) {
+        while (1) {
+        }
+    }
+    if (spin == 2) {
+        for (;;);
+    }
+    if (spin == 3) {
+        do {
+        } while (1);
+    }
+    return 1;
+}
+
 void main()
 {
     p0 = test_loop1();
@@ -146,4 +162,5 @@ void main()
     p4 = test_loop5();
     p5 = test_loop6();
     p6 = test_loop7();
+    p7 = test_loop8(0);
 }